@@ -1,9 +1,19 @@
 import streamlit as st
 import pandas as pd
-import json
-import datetime
 import re
-import io
+import threading
+
+from export_engine import (
+    EXPORTER_VERSION, MISSING_PART_PROPERTIES, OUTPUT_FORMATS, build_zip, dumps_json, encode_exports, export_cached,
+    export_filename, match_sheets, zip_filename
+)
+from bom_cache import shared_bom_cache
+from large_files import outputs_nbytes, result_nbytes, session_budget_bytes, spooled_nbytes, spooled_zip
+from prescan import scan_workbook
+from job_queue import ExportJob, JobQueue, QueueFull, latest_result
+from result_cache import ResultCache, content_digest
+from stage_timer import StageTimer
+from validation import MISSING, NAN_VALUE, warnings_csv
 
 
 # 页面更宽
@@ -117,18 +127,21 @@ st.markdown("""
         Please upload your Excel file (<b>.xlsx</b>, <b>.xls</b>) and click <b>Start</b> to process. You will get categorized JSON preview and downloads below.
 """, unsafe_allow_html=True)
 
-uploaded_file = st.file_uploader("Excel File", type=["xlsx", "xls"], key="uploaded_file")
+uploaded_files = st.file_uploader("Excel File", type=["xlsx", "xls"], key="uploaded_file", accept_multiple_files=True)
 
 # Start按钮右下角
 import streamlit.components.v1 as components
-if uploaded_file:
+if uploaded_files:
     # 重新渲染文件名和Start按钮在一行
     file_display_col, start_btn_col = st.columns([8,1], gap="small")
     with file_display_col:
         # 复用st的文件名展示
-        st.markdown(f"<div style='display:flex;align-items:center;gap:8px;'><span style='font-size:0.98em;'>📄 {uploaded_file.name} <span style='color:#888;font-size:0.92em;'>({round(uploaded_file.size/1024/1024,1)}MB)</span></span></div>", unsafe_allow_html=True)
+        for uploaded_file in uploaded_files:
+            st.markdown(f"<div style='display:flex;align-items:center;gap:8px;'><span style='font-size:0.98em;'>📄 {uploaded_file.name} <span style='color:#888;font-size:0.92em;'>({round(uploaded_file.size/1024/1024,1)}MB)</span></span></div>", unsafe_allow_html=True)
     with start_btn_col:
         start_clicked = st.button("🚀 Start", key="start_btn")
+    # 可选：匹配sheet分发到多进程并行提取（结果顺序与串行一致）
+    parallel_sheets = st.checkbox("⚡ Parallel sheet extraction", key="parallel_sheets", help="Extract matched sheets on several CPU cores. Useful for workbooks with many large mapping sheets.")
 else:
     start_clicked = False
 
@@ -136,400 +149,311 @@ st.markdown("</div>", unsafe_allow_html=True)
 
 
 start_processing = False
-if uploaded_file:
+if uploaded_files:
     if start_clicked:
         st.session_state["start_processing"] = True
     start_processing = st.session_state.get("start_processing", False)
 else:
     st.session_state["start_processing"] = False
 
-if not uploaded_file or not st.session_state.get("start_processing", False):
+if not uploaded_files or not st.session_state.get("start_processing", False):
     st.stop()
 
 
 
-def get_info_fields(df, info_fields):
-    info = {}
-    for i in range(min(30, len(df))):
-        key = str(df.iloc[i,0]).strip()
-        val = str(df.iloc[i,1]).strip() if df.shape[1]>1 else ""
-        if key in info_fields:
-            info[key] = val
-    return info
-
-def get_generated_on(xls=None, uploaded_file=None):
-    # 统一返回当前时刻，格式为m/d/Y h:M:S AM/PM（兼容Windows，去掉-）
-    now = datetime.datetime.now()
-    # %I 是12小时制，去除前导零
-    hour = str(int(now.strftime("%I")))
-    formatted = now.strftime(f"%m/%d/%Y {hour}:%M:%S %p")
-    # 去除月日的前导零
-    if formatted.startswith("0"): formatted = formatted[1:]
-    formatted = formatted.replace("/0", "/")
-    return formatted
-
-def extract_table(sheet_name, xls, uploaded_file, info, generated_on, table_name, filename, extra_fields=None):
-    try:
-        raw = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=None, dtype=str)
-        header_row_idx = None
-        # 只找 row nbr
-        for i in range(len(raw)):
-            cell_val = str(raw.iloc[i,0]).strip().lower()
-            if cell_val == "row nbr":
-                header_row_idx = i
-                break
-        if header_row_idx is None:
-            return None, f"Suspected sheet but no matching table found (missing 'row nbr'): {sheet_name}"
-        header_row = raw.iloc[header_row_idx]
-        valid_cols = []
-        for idx, col in enumerate(header_row):
-            col_str = str(col).strip()
-            if col_str == "" or col_str == "nan":
-                break
-            valid_cols.append(idx)
-            if col_str == "Notes":
-                break
-        df = raw.iloc[header_row_idx+1:, valid_cols]
-        df.columns = header_row[valid_cols]
-        df = df.dropna(how='all').fillna("").astype(str)
-
-        # 检查主字段缺失并收集warning
-        # 提取Version字段（所有类型都支持）
-        version_val = "1"
-        for i in range(min(30, len(raw))):
-            for j in range(raw.shape[1]-1):
-                cell = str(raw.iloc[i, j]).strip().lower()
-                if "version" in cell:
-                    version_val = str(raw.iloc[i, j+1]).strip()
-        if table_name in ["CFM", "Power"]:
-            main_fields = ["Document Number", "Document Revision", "Part Number", "Role", "Subrole"]
-            json_main = {
-                "Document Number": info.get("Item Number", ""),
-                "Document Revision": info.get("Part Revision", ""),
-                "Part Number": extra_fields["Part Number"] if extra_fields and "Part Number" in extra_fields else "",
-                "Role": info.get("Role", ""),
-                "Subrole": info.get("Subrole", ""),
-            }
+@st.cache_resource
+def get_result_cache():
+    # 进程内唯一的磁盘结果缓存，所有会话共享
+    return ResultCache.from_env(version=EXPORTER_VERSION)
+
+@st.cache_resource
+def get_job_queue():
+    # 进程内唯一的后台导出队列，所有会话共享，限制同时运行的导出数
+    return JobQueue.from_env()
+
+def get_upload_digest(uploaded_file):
+    # 同一次上传只计算一次内容哈希
+    upload_token = (getattr(uploaded_file, "file_id", None), uploaded_file.name, uploaded_file.size)
+    digests = st.session_state.setdefault("upload_digests", {})
+    if upload_token not in digests:
+        digests[upload_token] = content_digest(uploaded_file.getvalue())
+    return digests[upload_token]
+
+def get_upload_scan(uploaded_file, digest):
+    # 只读xlsx包元数据的预扫描（毫秒级），同一内容只扫描一次；xls返回None
+    scans = st.session_state.setdefault("upload_scans", {})
+    if digest not in scans:
+        scans[digest] = scan_workbook(uploaded_file.getvalue())
+    return scans[digest]
+
+def submit_export_jobs(uploaded_files, parallel_sheets, retry=False):
+    # 页面与导出引擎之间唯一的边界：每个上传的文件提交一个后台导出任务（跨会话走磁盘缓存），
+    # 同一内容在本会话已排队、运行或完成时不重复提交；取消或失败的任务在再次点击Start时重新提交。
+    # 上传同名文件的新版本时以它上一次的结果为基础增量导出：输入未变时只重新提取有变化的sheet
+    queue = get_job_queue()
+    jobs = st.session_state.setdefault("export_jobs", [])
+    for uploaded_file in uploaded_files:
+        digest = get_upload_digest(uploaded_file)
+        if any(job.digest == digest and (job.status in ("queued", "running", "done") or not retry) for job in jobs):
+            continue
+        # 预扫描：缺少Part Properties的工作簿不进入队列
+        scan = get_upload_scan(uploaded_file, digest)
+        if scan is not None and "Part Properties" not in scan:
+            st.error(f"{uploaded_file.name}: {MISSING_PART_PROPERTIES}")
+            continue
+        jobs[:] = [job for job in jobs if job.digest != digest]
+        job = ExportJob(uploaded_file.name, digest)
+        if scan is not None:
+            matched = match_sheets(scan.sheet_names)
+            size = sum(scan.size(sheet) for _, sheet in matched)
+            job.text = f"Queued ({len(matched)} matching sheets, {size / 1024 / 1024:.1f} MB of sheet data)"
+        try:
+            queue.submit(
+                job,
+                export_cached,
+                uploaded_file.getvalue(),
+                get_result_cache(),
+                digest=digest,
+                sheet_workers=queue.sheet_workers if parallel_sheets else 0,
+                timer=StageTimer.from_env(),
+                incremental=True,
+                previous=latest_result(jobs, uploaded_file.name)
+            )
+        except QueueFull as e:
+            st.error(str(e))
+            break
+        jobs.append(job)
+    return jobs
+
+JOB_POLL_SECONDS = 1.0
+
+def render_jobs(jobs):
+    # 每个任务一行：文件名、进度/状态、取消按钮。有任务在运行时此块每秒刷新一次，
+    # 有任务结束时整页重新运行以显示结果
+    for job in jobs:
+        name_col, status_col, action_col = st.columns([4, 5, 1], gap="small")
+        name_col.markdown(f"📄 {job.name}")
+        if job.active:
+            status_col.progress(min(max(job.progress, 0.0), 1.0), text=job.text)
+            if action_col.button("✖ Cancel", key=f"cancel_job_{job.id}"):
+                job.cancel()
+        elif job.status == "done":
+            status_col.caption(f"✅ Done in {job.seconds:.1f}s")
+        elif job.status == "failed":
+            status_col.error(f"Error reading Excel: {job.error}")
+        elif job.status == "evicted":
+            status_col.caption("Released from memory (click Start to export again)")
         else:
-            main_fields = ["Document Number", "Document Revision", "Child Part Number", "Parent Part Number", "Device", "Role", "Subrole"]
-            # 提取Subrole、Child Part Number
-            subrole_header = ""
-            for i in range(min(30, len(raw))):
-                for j in range(raw.shape[1]-1):
-                    cell = str(raw.iloc[i, j]).strip().lower()
-                    if "subrole" in cell:
-                        subrole_header = str(raw.iloc[i, j+1]).strip()
-            child_part_number = ""
-            try:
-                bom_df = st.session_state.get("bom_report_level1")
-                device_kw = str(extra_fields["Device"]).strip() if extra_fields and "Device" in extra_fields else ""
-                subrole_kw = subrole_header.strip().lower() if subrole_header else ""
-                if bom_df is not None and device_kw:
-                    for idx, row in bom_df.iterrows():
-                        desc = str(row.get("Part Description", "")).lower()
-                        match_device = device_kw.lower() in desc
-                        match_subrole = True
-                        if subrole_kw:
-                            if "utility" in subrole_kw:
-                                match_subrole = "utility" in desc
-                            else:
-                                match_subrole = (subrole_kw in desc) and ("utility" not in desc)
-                        if match_device and match_subrole:
-                            child_part_number = str(row.get("Part Number", ""))
-                            break
-            except Exception:
-                child_part_number = extra_fields["Child Part Number"] if extra_fields and "Child Part Number" in extra_fields else ""
-            json_main = {
-                "Document Number": info.get("Item Number", ""),
-                "Document Revision": info.get("Part Revision", ""),
-                "Child Part Number": child_part_number,
-                "Parent Part Number": extra_fields["Parent Part Number"] if extra_fields and "Parent Part Number" in extra_fields else "",
-                "Device": extra_fields["Device"] if extra_fields and "Device" in extra_fields else "",
-                "Role": info.get("Role", ""),
-                "Subrole": subrole_header,
-            }
-
-        # 收集warning到session_state['json_warnings']
-        if 'json_warnings' not in st.session_state:
-            st.session_state['json_warnings'] = []
-        for k in main_fields:
-            v = str(json_main.get(k, "")).strip()
-            if v == "" or v.lower() == "nan":
-                if not (table_name in ["CFM", "Power"] and k == "Part Number"):
-                    warn_msg = f"<b>Sheet:</b> <span style='color:#0072C6'>{sheet_name}</span> &nbsp; <b>Field:</b> <span style='color:#C80000'>{k}</span> &nbsp; <b>Status:</b> <span style='color:#C80000'>Missing</span>"
-                    st.session_state['json_warnings'].append(warn_msg)
-
-        # 生成最终json_dict，顺序与模板一致
-        json_dict = {
-            **json_main,
-            "TableName": table_name,
-            "Version": version_val,
-            "Generated On": generated_on,
-            "Rows": df.to_dict(orient="records")
+            status_col.caption("Cancelled")
+    finished = {job.id for job in jobs if not job.active}
+    if finished != st.session_state.get("finished_jobs"):
+        st.rerun()
+
+def render_warnings(json_warnings, key=None):
+    # 美化 warning 展示为 HTML 列表：先列主字段缺失，再列Rows校验（空列、row nbr重复/不连续），可下载为CSV
+    def items(warnings):
+        return "".join(
+            f"<li style='margin-bottom:4px'><b>Sheet:</b> <span style='color:#0072C6'>{w.sheet}</span> &nbsp; "
+            f"<b>Field:</b> <span style='color:#C80000'>{w.field}</span> &nbsp; "
+            f"<b>Status:</b> <span style='color:#C80000'>{w.status}</span></li>"
+            for w in warnings
+        )
+
+    fields = [w for w in json_warnings if w.code in (MISSING, NAN_VALUE)]
+    rows = [w for w in json_warnings if w.code not in (MISSING, NAN_VALUE)]
+    st.warning("Warnings:", icon="⚠️")
+    if fields:
+        st.markdown(f"<ul style='margin-left:1em;'>{items(fields)}</ul>", unsafe_allow_html=True)
+    if rows:
+        st.markdown("**Table checks:**")
+        st.markdown(f"<ul style='margin-left:1em;'>{items(rows)}</ul>", unsafe_allow_html=True)
+    st.download_button(
+        label="Download warnings (CSV)",
+        data=warnings_csv(json_warnings),
+        file_name="warnings.csv",
+        mime="text/csv",
+        key=key or "download_warnings"
+    )
+
+def render_changes(changes):
+    # 与上一次上传相比新增/变化/删除的文件
+    if changes is None:
+        return
+    st.info(f"Compared with the previous upload: {changes}.")
+    if changes.added or changes.changed or changes.removed:
+        with st.expander("Changed files", expanded=False):
+            for label, names in (("Added", changes.added), ("Changed", changes.changed), ("Removed", changes.removed)):
+                if names:
+                    st.markdown(f"**{label}:** " + ", ".join(names))
+
+OUTPUT_FORMAT_LABELS = {
+    "records": "JSON (template)",
+    "columnar": "Columnar JSON",
+    "ndjson": "NDJSON",
+}
+OUTPUT_MIME_TYPES = {"records": "application/json", "columnar": "application/json", "ndjson": "application/x-ndjson"}
+
+def get_export_outputs(json_files, job_id, compact, fmt="records"):
+    # 每个导出在生成后只序列化一次（切换紧凑模式或输出格式时重新序列化），rerun时直接复用
+    outputs_key = (job_id, compact, fmt)
+    if st.session_state.get("export_outputs_key") != outputs_key:
+        timer = StageTimer.from_env()
+        st.session_state["export_outputs"] = {
+            "files": encode_exports(json_files, compact, timer, fmt), "zip": None, "zip_nbytes": 0,
+            "zip_lock": threading.Lock(), "timer": timer, "source": (json_files, compact, fmt)
         }
-        return json_dict, None
-    except Exception as e:
-        return None, str(e)
-
-def extract_device_child_parent(sheet_name, xls, uploaded_file, info):
-    # 遍历sheet所有单元格，模糊查找包含'device'的单元格，取右侧的值
-    device_val = ""
-    try:
-        raw = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=None, dtype=str)
-        found = False
-        for i in range(raw.shape[0]):
-            for j in range(raw.shape[1] - 1):
-                cell = str(raw.iloc[i, j]).strip().lower()
-                if "device" in cell:
-                    device_val = str(raw.iloc[i, j + 1]).strip()
-                    found = True
-                    break
-            if found:
-                break
-    except Exception:
-        device_val = ""
-    parent_part_number = info.get("Item Number", "")
-    child_part_number = ""
-    if device_val and "Bom Report" in xls.sheet_names:
-        bom_df = pd.read_excel(uploaded_file, sheet_name="Bom Report", header=0, dtype=str)
-        bom_df.columns = [str(c).strip() for c in bom_df.columns]
-        if "BOM Level" in bom_df.columns and "Part Number" in bom_df.columns and "Part Description" in bom_df.columns:
-            mask = (bom_df["BOM Level"].astype(str).str.strip() == "1")
-            filtered = bom_df[mask]
-            for _, row in filtered.iterrows():
-                desc = str(row["Part Description"]).strip()
-                if device_val and device_val in desc:
-                    child_part_number = str(row["Part Number"]).strip()
-                    break
-    return device_val, parent_part_number, child_part_number
-
-def get_sheet_by_keyword(xls, keyword):
-    # 返回第一个包含keyword（不区分大小写）的sheet名
-    for name in xls.sheet_names:
-        if keyword.lower() in name.lower():
-            return name
-    return None
-
-def download_all_button(json_files, key=None):
-    import zipfile
-    buf = io.BytesIO()
-    for_download_name = "All_JSON_Exports.zip"
-    # 尝试从session_state中获取Item Number
-    item_number = None
-    part_info = st.session_state.get("part_properties_info")
-    if part_info is not None:
-        try:
-            # part_info是DataFrame，列名应为'Name'和'Value'
-            item_row = part_info[part_info['Name'] == 'Item Number']
-            if not item_row.empty:
-                val = item_row.iloc[0]['Value']
-                if val and val != "N/A":
-                    item_number = str(val).strip()
-        except Exception:
-            pass
-    if item_number:
-        for_download_name = f"{item_number}.zip"
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        for fname, content in json_files.items():
-            zf.writestr(fname, json.dumps(content, ensure_ascii=False, indent=4))
-    buf.seek(0)
+        st.session_state["export_outputs_key"] = outputs_key
+    return st.session_state["export_outputs"]
+
+def export_payload(outputs, fname):
+    # 已序列化的文件被内存预算释放后，下载时重新序列化（不再保留）
+    json_files, compact, fmt = outputs["source"]
+    files = outputs["files"]
+    if files is not None:
+        return files[export_filename(fname, fmt)]
+    return dumps_json(json_files[fname], compact, fmt).encode("utf-8")
+
+def load_result(job):
+    # 被内存预算释放的结果从共享的磁盘缓存重新加载；缓存中也没有时标记为evicted，再次点击Start重新导出
+    if job.result is None and job.status == "done":
+        job.result = get_result_cache().get(job.digest)
+        if job.result is None:
+            job.status = "evicted"
+    return job.result
+
+def enforce_memory_budget(jobs, shown_job, outputs):
+    # 本会话保留的数据超过预算（JSON_EXPORTER_SESSION_BUDGET_MB）时依次释放：
+    # 其他任务的结果和预览数据（仍在共享的磁盘缓存中，切换回来时重新加载）、已生成的ZIP、
+    # 当前结果已序列化的下载文件（点击下载时再序列化）
+    budget = session_budget_bytes()
+    if not budget:
+        return
+    sizes = st.session_state.setdefault("result_nbytes", {})
+    held = [job for job in jobs if job.result is not None]
+    for job in held:
+        if job.id not in sizes:
+            sizes[job.id] = result_nbytes(job.result)
+    total = sum(sizes[job.id] for job in held) + (outputs_nbytes(outputs) if outputs else 0)
+    for job in sorted(held, key=lambda job: job.finished or 0):
+        if total <= budget:
+            return
+        if job is not shown_job:
+            job.result = None
+            total -= sizes.pop(job.id)
+    if outputs and total > budget and outputs["zip"] is not None:
+        # 正在下载的线程仍持有该文件，不在这里关闭，回收时删除
+        total -= outputs["zip_nbytes"]
+        outputs["zip"], outputs["zip_nbytes"] = None, 0
+    if outputs and total > budget and outputs["files"] is not None:
+        outputs["files"] = None
+
+PREVIEW_PAGE_ROWS = 50
+
+def render_json_preview(content, key):
+    # 只发送表头字段和当前页的Rows，大表不会整份传到浏览器
+    rows = content.get("Rows", [])
+    st.json({k: v for k, v in content.items() if k != "Rows"}, expanded=True)
+    if not rows:
+        st.caption("Rows: 0")
+        return
+    pages = (len(rows) + PREVIEW_PAGE_ROWS - 1) // PREVIEW_PAGE_ROWS
+    page = st.number_input("Rows page", min_value=1, max_value=pages, value=1, key=key) if pages > 1 else 1
+    start = (page - 1) * PREVIEW_PAGE_ROWS
+    end = min(start + PREVIEW_PAGE_ROWS, len(rows))
+    st.caption(f"Rows {start + 1}–{end} of {len(rows)}")
+    st.json(rows[start:end], expanded=False)
+
+def download_all_button(outputs, part_info, key=None):
+    # ZIP名优先用Part Properties的Item Number
+    for_download_name = zip_filename(part_info)
+
+    def zip_bytes():
+        # 点击下载时才压缩（多线程），每个结果只压缩一次，保存在spooled临时文件中，较大的ZIP不占用会话内存；
+        # 在下载线程中执行，不访问session_state
+        with outputs["zip_lock"]:
+            zip_file = outputs["zip"]
+            if zip_file is None:
+                json_files, compact, fmt = outputs["source"]
+                files = outputs["files"] if outputs["files"] is not None else encode_exports(json_files, compact, outputs["timer"], fmt)
+                zip_file = build_zip(files, spooled_zip(), timer=outputs["timer"])
+                outputs["zip"], outputs["zip_nbytes"] = zip_file, spooled_nbytes(zip_file)
+            zip_file.seek(0)
+            return zip_file.read()
+
     st.download_button(
         label="📦 Downloadd all JSON (ZIP)",
-        data=buf,
+        data=zip_bytes,
         file_name=for_download_name,
         mime="application/zip",
         key=key or "download_all_zip_button"
     )
 
-if uploaded_file:
-    # 用文件名+文件大小做缓存key，保证同一文件不重复处理
-    file_id = f"{uploaded_file.name}_{uploaded_file.size}"
-    # 每次新文件上传时清空旧warning
-    if st.session_state.get("last_file_id") != file_id:
-        st.session_state['json_warnings'] = []
-    if (
-        "json_files" not in st.session_state or
-        "preview_tabs" not in st.session_state or
-        st.session_state.get("last_file_id") != file_id
-    ):
-        try:
-            xls = pd.ExcelFile(uploaded_file)
-            # 统计所有sheet匹配数
-            keywords = [
-                ("Storage", "Storage Mapping"),
-                ("PCIe", "PCIe Slot Mapping"),
-                ("Memory", "Memory Mapping"),
-                ("Power", "Power"),
-                ("CFM", "CFM")
-            ]
-            matched_sheets = []
-            for sheet_name in xls.sheet_names:
-                for kw, display_name in keywords:
-                    if display_name == "Power":
-                        # 只有表名等于Power（忽略大小写）才匹配
-                        if sheet_name.strip().lower() == "power":
-                            matched_sheets.append((display_name, sheet_name))
-                    else:
-                        if kw.lower() in sheet_name.lower():
-                            matched_sheets.append((display_name, sheet_name))
-            # 进度条总步数：Part Properties + BOM Report + 所有matched_sheets
-            total_steps = 2 + len(matched_sheets)
-            processed_steps = 0
-            avg_time_per_sheet = 1.5  # 估算每步1.5秒
-            est_total = int(total_steps * avg_time_per_sheet)
-            progress_bar = st.progress(0, text="Preparing to process...")
-
-            # Step 1: Part Properties
-            if "Part Properties" not in xls.sheet_names:
-                st.error("No 'Part Properties' sheet found in this Excel file.")
-                st.session_state["json_files"] = {}
-                st.session_state["preview_tabs"] = []
-                st.session_state["last_file_id"] = file_id
-            else:
-                df = pd.read_excel(uploaded_file, sheet_name="Part Properties", header=None)
-                info_fields = [
-                    "Item Number",
-                    "Part Class Path",
-                    "Part Description",
-                    "Part Revision",
-                    "Business Group",
-                    "Role",
-                    "Subrole",
-                    "Generation",
-                    "Processor Type"
-                ]
-                info = get_info_fields(df, info_fields)
-                # 构建左右两列的表格，左为字段，右为值
-                df_display = pd.DataFrame({"Name": info_fields, "Value": [info.get(k, "N/A") for k in info_fields]})
-                st.session_state["part_properties_info"] = df_display.copy()
-                # 只赋值，不展示，展示逻辑统一放在信息区
-                processed_steps += 1
-                progress_bar.progress(processed_steps/total_steps, text=f"Step 1/Part Properties info displayed. Estimated {est_total-processed_steps*int(avg_time_per_sheet)}s left.")
-
-                # Step 2: BOM Report
-                if "Bom Report" in xls.sheet_names:
-                    bom_fields = [
-                        "BOM/Substitute BOM?",
-                        "BOM Level",
-                        "Part Number",
-                        "Part Revision",
-                        "Part Description",
-                        "Part Classification",
-                        "MSF IDs",
-                        "Substitutes",
-                        "BOM Quantity"
-                    ]
-                    try:
-                        # 先不指定header，读取原始数据
-                        raw_bom = pd.read_excel(uploaded_file, sheet_name="Bom Report", header=None, dtype=str)
-                        header_row_idx = None
-                        for i in range(len(raw_bom)):
-                            first_cell = str(raw_bom.iloc[i,0]).strip()
-                            if first_cell == "BOM/Substitute BOM?":
-                                header_row_idx = i
-                                break
-                        if header_row_idx is not None:
-                            bom_df = pd.read_excel(
-                                uploaded_file,
-                                sheet_name="Bom Report",
-                                header=header_row_idx,
-                                dtype=str
-                            )
-                            bom_df.columns = [str(c).strip() for c in bom_df.columns]
-                            # 只保留BOM Level=1的行
-                            if "BOM Level" in bom_df.columns:
-                                filtered_bom = bom_df[bom_df["BOM Level"].astype(str).str.strip() == "1"]
-                            else:
-                                filtered_bom = bom_df.iloc[0:0]  # 空表
-                            # 只保留需要的列
-                            display_bom = filtered_bom[[c for c in bom_fields if c in filtered_bom.columns]].fillna("")
-                            st.session_state["bom_report_level1"] = display_bom.copy()
-                            # 只赋值，不展示，展示逻辑统一放在信息区
-                        else:
-                            st.warning("BOM Report header (BOM/Substitute BOM?) not found.")
-                    except Exception as e:
-                        st.warning(f"Failed to read BOM Report: {e}")
-                else:
-                    st.warning("No 'Bom Report' sheet found in this Excel file.")
-                processed_steps += 1
-                progress_bar.progress(processed_steps/total_steps, text=f"Step 2/BOM Report displayed. Estimated {est_total-processed_steps*int(avg_time_per_sheet)}s left.")
-
-                # Step 3: 遍历所有sheet生成JSON
-                generated_on = get_generated_on()
-                json_files = {}
-                preview_tabs = []
-                start_time = datetime.datetime.now()
-                for idx, (display_name, sheet) in enumerate(matched_sheets):
-                    current_msg = f"Generating {display_name} ({sheet}) JSON..."
-                    elapsed = (datetime.datetime.now() - start_time).total_seconds()
-                    est_left = max(0, est_total - int(elapsed))
-                    progress_bar.progress((processed_steps+idx)/total_steps, text=f"{current_msg} Estimated {est_left}s left.")
-                    if display_name in ["Storage Mapping", "PCIe Slot Mapping", "Memory Mapping"]:
-                        device, parent, child = extract_device_child_parent(sheet, xls, uploaded_file, info)
-                        extra = {"Device": device, "Parent Part Number": parent, "Child Part Number": child}
-                        table_name = display_name if display_name != "Memory Mapping" else "Memory Mappping"
-                    else:
-                        extra = {"Part Number": ""}
-                        table_name = display_name
-                    content, err = extract_table(
-                        sheet, xls, uploaded_file, info, generated_on,
-                        table_name=table_name,
-                        filename=None,  # filename参数不再用于命名
-                        extra_fields=extra
-                    )
-                    # 统一文件名格式：CFM/Power不带subrole，其他带subrole，且保证文件名唯一
-                    if content:
-                        doc_num = content.get("Document Number", "")
-                        doc_rev = content.get("Document Revision", "")
-                        table_name_val = content.get("TableName", "")
-                        if table_name_val in ["CFM", "Power"]:
-                            base_fname = f"{doc_num}_Rev{doc_rev}_{table_name_val}.json"
-                        else:
-                            subrole_val = content.get("Subrole", "")
-                            base_fname = f"{doc_num}_Rev{doc_rev}_{table_name_val}_{subrole_val}.json"
-                        # 保证文件名唯一，如有重名自动加sheet名或序号
-                        fname = base_fname
-                        if fname in json_files:
-                            # 若sheet名已在文件名中则不再重复加
-                            sheet_tag = str(sheet).replace(' ', '_').replace('/', '_')
-                            alt_fname = f"{base_fname.rsplit('.json',1)[0]}_{sheet_tag}.json"
-                            idx2 = 2
-                            while alt_fname in json_files:
-                                alt_fname = f"{base_fname.rsplit('.json',1)[0]}_{sheet_tag}{idx2}.json"
-                                idx2 += 1
-                            fname = alt_fname
-                        json_files[fname] = content
-                        preview_tabs.append((display_name, sheet, content, fname))
-                    else:
-                        st.warning(f"{sheet}: {err}")
-                processed_steps += len(matched_sheets)
-                # 进度条100%
-                progress_bar.progress(1.0, text="All JSON files generated!")
-                progress_bar.empty()
-                st.session_state["json_files"] = json_files
-                st.session_state["preview_tabs"] = preview_tabs
-                st.session_state["last_file_id"] = file_id
-        except Exception as e:
-            st.error(f"Error reading Excel: {e}")
-            st.session_state["json_files"] = {}
-            st.session_state["preview_tabs"] = []
-            st.session_state["last_file_id"] = file_id
+def timing_report(outputs, export_timings, key=None):
+    # 本次导出各阶段的耗时/行数/字节数；ZIP在下载时才生成，CSV在点击下载时汇总（不访问session_state）
+    export_timings = list(export_timings)
+
+    def report():
+        timer = StageTimer()
+        timer.records = export_timings + outputs["timer"].records
+        return timer
+
+    with st.expander("Timing report", expanded=False):
+        st.dataframe(
+            pd.DataFrame(report().summary_rows(), columns=["Stage", "Count", "Seconds", "Rows", "Bytes"]),
+            use_container_width=True, hide_index=True
+        )
+        bom_stats = shared_bom_cache().stats()
+        st.caption(
+            f"Shared BOM cache: {bom_stats['hits']} hits, {bom_stats['misses']} misses, {bom_stats['evictions']} evictions; "
+            f"{bom_stats['entries']} BOMs, {bom_stats['bytes'] / 1024 / 1024:.1f} of {bom_stats['max_bytes'] / 1024 / 1024:.0f} MB."
+        )
+        st.download_button(
+            label="Download timing report (CSV)",
+            data=lambda: report().report_csv(),
+            file_name="timing_report.csv",
+            mime="text/csv",
+            key=key or "download_timing_report"
+        )
+
+jobs = submit_export_jobs(uploaded_files, parallel_sheets, retry=start_clicked)
+st.session_state["finished_jobs"] = {job.id for job in jobs if not job.active}
+jobs_panel = st.fragment(run_every=JOB_POLL_SECONDS if any(job.active for job in jobs) else None)(render_jobs)
+jobs_panel(jobs)
+done_jobs = sorted((job for job in jobs if job.status == "done"), key=lambda job: job.finished)
+if done_jobs:
+    # 默认显示最近完成的任务；多个文件时可切换
+    job = done_jobs[-1]
+    if len(done_jobs) > 1:
+        choice = st.selectbox(
+            "Show results for", range(len(done_jobs)), index=len(done_jobs) - 1,
+            key=f"result_job_{len(done_jobs)}", format_func=lambda k: done_jobs[k].name
+        )
+        job = done_jobs[choice]
+    # 用文件内容哈希做缓存key，保证同一文件不重复处理、修改过的文件一定重新生成
+    file_id = job.digest
+    result = load_result(job)
+    if result is None:
+        st.info(f"The results for {job.name} were released to stay within the session memory budget. Click Start to export it again.")
+        st.stop()
+    if result.error:
+        st.error(result.error)
+    for msg in result.messages:
+        st.warning(msg)
 
 
     # 始终展示Part Properties Info和BOM Report（避免下载后消失）
 
-
     # ====== 信息区 ======
 
     st.markdown("""
     <div class='card-section'>
         <div class='step-title'><span class='step-num'>2</span>Part Properties & BOM Report</div>
     """, unsafe_allow_html=True)
-    part_info = st.session_state.get("part_properties_info")
+    part_info = result.part_properties_info
     if part_info is not None:
         with st.expander("Part Properties Info", expanded=True):
             st.table(part_info)
-    bom_report = st.session_state.get("bom_report_level1")
+    bom_report = result.bom_report_level1
     if bom_report is not None:
         with st.expander("BOM Report (BOM Level=1)", expanded=False):
             st.dataframe(bom_report, use_container_width=True)
@@ -537,9 +461,9 @@ if uploaded_file:
 
 
     # 展示所有JSON预览和下载（无论是否刚刚生成还是缓存）
-    json_files = st.session_state.get("json_files", {})
-    preview_tabs = st.session_state.get("preview_tabs", [])
-    json_warnings = st.session_state.get("json_warnings", [])
+    json_files = result.json_files
+    preview_tabs = result.preview_tabs
+    json_warnings = result.json_warnings
 
     if preview_tabs:
         st.markdown("""
@@ -547,11 +471,9 @@ if uploaded_file:
             <div class='step-title'><span class='step-num'>3</span>JSON Preview & Download</div>
         """, unsafe_allow_html=True)
         st.success("Processing Done. See below.")
+        render_changes(result.changes)
         if json_warnings:
-            # 美化 warning 展示为 HTML 列表，保留原有 HTML 样式
-            warning_html = "<ul style='margin-left:1em;'>" + "".join([f"<li style='margin-bottom:4px'>{w}</li>" for w in json_warnings]) + "</ul>"
-            st.warning("Warnings:", icon="⚠️")
-            st.markdown(warning_html, unsafe_allow_html=True)
+            render_warnings(json_warnings, key=f"download_warnings_{file_id}")
         category_map = {
             "Power": "Power",
             "CFM": "CFM",
@@ -560,31 +482,51 @@ if uploaded_file:
             "Storage Mapping": "Storage Mapping"
         }
         categories = ["Power", "CFM", "Memory Mapping", "PCIe Mapping", "Storage Mapping"]
-        cat_tabs = st.tabs(categories)
-        for idx, cat in enumerate(categories):
-            with cat_tabs[idx]:
-                found = False
-                for i, (display_name, sheet, content, fname) in enumerate(preview_tabs):
-                    if category_map.get(display_name) == cat:
-                        found = True
-                        st.markdown(f"**Sheet:** {sheet}")
-                        st.json(content, expanded=False)
-                        st.download_button(
-                            label=f"Download {fname}",
-                            data=json.dumps(content, ensure_ascii=False, indent=4),
-                            file_name=fname,
-                            mime="application/json",
-                            key=f"download_{file_id}_{fname}_{display_name}_{sheet}_{i}"
-                        )
-                if not found:
-                    st.info(f"No JSON file in this category.")
+        format_col, compact_col = st.columns([3, 2], gap="small")
+        output_format = format_col.radio(
+            "Output format", list(OUTPUT_FORMATS), horizontal=True, key="output_format",
+            format_func=OUTPUT_FORMAT_LABELS.get,
+            help="Columnar JSON stores the column names once plus one value array per row; NDJSON writes the header fields on the first line and one row object per line."
+        )
+        compact_json = compact_col.checkbox(
+            "Compact JSON (no indentation)", key="compact_json", disabled=output_format == "ndjson",
+            help="Minified output for downstream systems that don't need indent=4."
+        )
+        outputs = get_export_outputs(json_files, job.id, compact_json, output_format)
+        # 只渲染选中的分类；分类内只预览选中的sheet，Rows按页发送到浏览器
+        cat_counts = {cat: sum(1 for item in preview_tabs if category_map.get(item[0]) == cat) for cat in categories}
+        cat = st.radio(
+            "Category", categories, horizontal=True, key="preview_category",
+            format_func=lambda c: f"{c} ({cat_counts[c]})", label_visibility="collapsed"
+        )
+        cat_items = [(i, item) for i, item in enumerate(preview_tabs) if category_map.get(item[0]) == cat]
+        if not cat_items:
+            st.info(f"No JSON file in this category.")
+        else:
+            for i, (display_name, sheet, content, fname) in cat_items:
+                out_name = export_filename(fname, output_format)
+                st.download_button(
+                    label=f"Download {out_name}",
+                    data=lambda fname=fname, outputs=outputs: export_payload(outputs, fname),
+                    file_name=out_name,
+                    mime=OUTPUT_MIME_TYPES[output_format],
+                    key=f"download_{file_id}_{fname}_{display_name}_{sheet}_{i}"
+                )
+            choice = st.selectbox(
+                "Preview", range(len(cat_items)), key=f"preview_sheet_{cat}",
+                format_func=lambda k: f"{cat_items[k][1][1]} → {cat_items[k][1][3]}"
+            )
+            i, (display_name, sheet, content, fname) = cat_items[choice]
+            st.markdown(f"**Sheet:** {sheet}")
+            render_json_preview(content, key=f"preview_page_{file_id}_{i}")
         st.markdown("\n")
-        download_all_button(json_files, key=f"download_all_zip_button_{file_id}")
+        download_all_button(outputs, part_info, key=f"download_all_zip_button_{file_id}")
+        timing_report(outputs, result.timings, key=f"download_timing_report_{file_id}")
         st.markdown("</div>", unsafe_allow_html=True)
     else:
-        json_warnings = st.session_state.get("json_warnings", [])
+        render_changes(result.changes)
         if json_warnings:
-            warning_html = "<ul style='margin-left:1em;'>" + "".join([f"<li style='margin-bottom:4px'>{w}</li>" for w in json_warnings]) + "</ul>"
-            st.warning("Warnings:", icon="⚠️")
-            st.markdown(warning_html, unsafe_allow_html=True)
+            render_warnings(json_warnings, key=f"download_warnings_{file_id}")
         st.info("No JSON export file generated. Please check the Excel content or sheet names.")
+    # 超过会话内存预算时释放其他任务的预览数据、ZIP和已序列化的文件
+    enforce_memory_budget(jobs, job, st.session_state.get("export_outputs"))
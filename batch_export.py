@@ -0,0 +1,195 @@
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from export_engine import OUTPUT_FORMATS, build_zip, encode_exports, export_workbook, stream_workbook, zip_filename
+from large_files import is_large_file
+from readers import READERS
+from stage_timer import StageTimer
+from validation import warnings_csv
+from zip_writer import zip_level, zip_method
+
+EXCEL_SUFFIXES = (".xlsx", ".xls")
+
+
+def collect_workbooks(paths):
+    # 参数可以是文件或目录（目录只取第一层的Excel文件，跳过Excel锁文件 ~$xxx）
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and name.lower().endswith(EXCEL_SUFFIXES) and not name.startswith("~$"):
+                    files.append(full)
+        else:
+            files.append(path)
+    return files
+
+def export_one(path, out_dir, write_json=True, write_zip=True, sheet_workers=0, stream=False, compact=False, timing=False, fmt="records", warnings=False):
+    # 单个工作簿：生成与页面一致的JSON文件和ZIP，输出到 out_dir/<工作簿名>/（fmt见 OUTPUT_FORMATS）
+    # timing=True 时把各阶段计时写入 out_dir/<工作簿名>/timing_report.csv，汇总放在 stats["timing"]；
+    # warnings=True 时把字段缺失和Rows校验的warning写入 out_dir/<工作簿名>/warnings.csv
+    start = time.perf_counter()
+    stats = {"path": path, "files": 0, "rows": 0, "bytes": 0, "warnings": 0, "error": None, "timing": None}
+    timer = StageTimer.from_env()
+    try:
+        stats["bytes"] = os.path.getsize(path)
+        if is_large_file(stats["bytes"]):
+            # 大文件模式：不读进内存，工作簿按memory map读取
+            data = path
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+        if stream:
+            result = stream_one(data, path, out_dir, write_json, write_zip, compact, timer, fmt)
+        else:
+            result = export_workbook(data, sheet_workers=sheet_workers, timer=timer)
+        if result.error:
+            stats["error"] = result.error
+        elif stream:
+            stats["files"] = len(result.json_files)
+            stats["rows"] = sum(result.row_counts.values())
+            stats["warnings"] = len(result.json_warnings) + len(result.messages)
+        else:
+            target = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0])
+            os.makedirs(target, exist_ok=True)
+            # 每个文件只序列化一次，JSON文件和ZIP共用
+            outputs = encode_exports(result.json_files, compact, timer, fmt)
+            if write_json:
+                for fname, payload in outputs.items():
+                    # 文件名中的 / 与ZIP解压后的目录结构保持一致
+                    file_path = os.path.join(target, fname)
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    with open(file_path, "wb") as f:
+                        f.write(payload)
+            if write_zip and outputs:
+                with open(os.path.join(target, zip_filename(result.part_properties_info)), "wb") as f:
+                    build_zip(outputs, f, timer)
+            stats["files"] = len(result.json_files)
+            stats["rows"] = sum(result.row_counts.values())
+            stats["warnings"] = len(result.json_warnings) + len(result.messages)
+        if warnings and not result.error:
+            target = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0])
+            os.makedirs(target, exist_ok=True)
+            with open(os.path.join(target, "warnings.csv"), "w", encoding="utf-8", newline="") as f:
+                f.write(warnings_csv(result.json_warnings))
+    except Exception as e:
+        stats["error"] = f"Error reading Excel: {e}"
+    stats["seconds"] = time.perf_counter() - start
+    if timing and timer.records:
+        target = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0])
+        os.makedirs(target, exist_ok=True)
+        with open(os.path.join(target, "timing_report.csv"), "w", encoding="utf-8", newline="") as f:
+            f.write(timer.report_csv())
+        stats["timing"] = timer.summary()
+    return stats
+
+def stream_one(data, path, out_dir, write_json=True, write_zip=True, compact=False, timer=None, fmt="records"):
+    # 流式导出：每个JSON逐段写入文件，再原样拷贝进ZIP，内存占用与行数无关
+    target = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0])
+    os.makedirs(target, exist_ok=True)
+    # ZIP名要等Part Properties读完才知道，先写临时文件
+    partial_zip = os.path.join(target, ".partial.zip")
+    level = zip_level()
+    zf = zipfile.ZipFile(partial_zip, "w", zip_method(level), compresslevel=level or None) if write_zip else None
+
+    timer = timer if timer is not None else StageTimer()
+
+    def write_export(fname, chunks):
+        file_path = os.path.join(target, fname)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        part_path = file_path + ".part"
+        try:
+            with open(part_path, "w", encoding="utf-8", newline="") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except Exception:
+            os.remove(part_path)
+            raise
+        os.replace(part_path, file_path)
+        if zf is not None:
+            with timer.stage("ZIP", fname) as record:
+                zf.write(file_path, fname)
+                record.bytes = os.path.getsize(file_path)
+        if not write_json:
+            os.remove(file_path)
+
+    try:
+        result = stream_workbook(data, write_export, compact=compact, timer=timer, fmt=fmt)
+    finally:
+        if zf is not None:
+            zf.close()
+    if zf is not None:
+        if result.json_files and not result.error:
+            os.replace(partial_zip, os.path.join(target, zip_filename(result.part_properties_info)))
+        else:
+            os.remove(partial_zip)
+    return result
+
+def format_stats(stats):
+    if stats["error"]:
+        return f"FAILED {stats['path']}: {stats['error']}"
+    seconds = max(stats["seconds"], 1e-9)
+    line = (
+        f"{stats['path']}: {stats['files']} files, {stats['rows']} rows, {stats['warnings']} warnings "
+        f"in {stats['seconds']:.2f}s ({stats['rows'] / seconds:.0f} rows/s, "
+        f"{stats['bytes'] / 1024 / 1024 / seconds:.2f} MB/s)"
+    )
+    if stats.get("timing"):
+        line += "\n" + stats["timing"]
+    return line
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Part Properties / BOM / mapping sheets of Excel workbooks to JSON without the Streamlit UI.")
+    parser.add_argument("inputs", nargs="+", help="Excel files or directories containing them")
+    parser.add_argument("-o", "--output", default="json_exports", help="output directory (default: json_exports)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--sheet-workers", type=int, default=0, help="extract the sheets of each workbook with this many processes (default: serial)")
+    parser.add_argument("--stream", action="store_true", help="stream rows straight into the output files (bounded memory for very large xlsx sheets; reads them with openpyxl)")
+    parser.add_argument("--compact", action="store_true", help="write minified JSON instead of indent=4 (uses orjson when installed)")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default="records", help="records = the JSON template (default), columnar = column list plus row arrays, ndjson = header line plus one row per line")
+    parser.add_argument("--reader", choices=["auto", *READERS], help="spreadsheet reader backend (default: auto = calamine when installed, else openpyxl)")
+    parser.add_argument("--timing", action="store_true", help="print per-stage timings and write timing_report.csv next to each workbook's output")
+    parser.add_argument("--warnings", action="store_true", help="write warnings.csv (missing fields, empty columns, duplicate or non-sequential row nbr) next to each workbook's output")
+    parser.add_argument("--zip-level", type=int, choices=range(10), metavar="0-9", help="ZIP compression level, 0 = store only (default: JSON_EXPORTER_ZIP_LEVEL or 6)")
+    parser.add_argument("--no-json", action="store_true", help="only write the ZIP archive")
+    parser.add_argument("--no-zip", action="store_true", help="only write the individual JSON files")
+    args = parser.parse_args(argv)
+    if args.reader:
+        # 通过环境变量传给工作簿的读取（子进程也会继承）
+        os.environ["JSON_EXPORTER_READER"] = args.reader
+    if args.zip_level is not None:
+        os.environ["JSON_EXPORTER_ZIP_LEVEL"] = str(args.zip_level)
+
+    files = collect_workbooks(args.inputs)
+    if not files:
+        print("No Excel workbooks found.", file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    options = (args.output, not args.no_json, not args.no_zip, args.sheet_workers, args.stream, args.compact, args.timing, args.format, args.warnings)
+    start = time.perf_counter()
+    results = []
+    if args.workers <= 1 or len(files) == 1:
+        for path in files:
+            results.append(export_one(path, *options))
+            print(format_stats(results[-1]), flush=True)
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(files))) as pool:
+            futures = [pool.submit(export_one, path, *options) for path in files]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print(format_stats(results[-1]), flush=True)
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if r["error"]]
+    print(
+        f"Done: {len(results) - len(failed)}/{len(results)} workbooks in {elapsed:.2f}s "
+        f"({len(results) / max(elapsed, 1e-9):.2f} workbooks/s)"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
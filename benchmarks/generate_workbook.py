@@ -0,0 +1,111 @@
+import argparse
+import random
+
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill
+
+# 与真实工作簿相同的结构：Part Properties、带标题区的Bom Report、Storage/PCIe/Memory Mapping、Power、CFM
+DEVICES = ["SSD", "NVMe Drive", "DIMM", "Riser", "PSU", "Fan", "Backplane", "OCP NIC"]
+SUBROLES = ["Primary", "Secondary", "Utility"]
+MAPPING_KINDS = ["Storage Mapping", "PCIe Mapping", "Memory Mapping"]
+MAPPING_COLUMNS = ["Row Nbr", "Slot", "Connector", "Lane Width", "Device Name", "Location", "Notes"]
+_BLANK_FILL = PatternFill("solid", fgColor="FFF2CC")
+
+
+def _part_properties(wb, item_number):
+    ws = wb.active
+    ws.title = "Part Properties"
+    for name, value in [
+        ("Item Number", item_number),
+        ("Part Class Path", "Systems/Server/Rack"),
+        ("Part Description", "2U rack server system board"),
+        ("Part Revision", "B"),
+        ("Business Group", "Server"),
+        ("Role", "System"),
+        ("Subrole", "Main"),
+        ("Generation", 7),
+        ("Processor Type", "x86"),
+    ]:
+        ws.append([name, value])
+
+def _bom_report(wb, rng, bom_rows):
+    # 标题区若干行后才是表头，Level 1/2/3混合，描述中带device关键字和subrole
+    ws = wb.create_sheet("Bom Report")
+    ws.append(["BOM Report"])
+    ws.append([])
+    ws.append(["Generated", "by PLM export"])
+    ws.append(["BOM/Substitute BOM?", "BOM Level", "Part Number", "Part Revision", "Part Description",
+               "Part Classification", "MSF IDs", "Substitutes", "BOM Quantity", "Find Number"])
+    for i in range(bom_rows):
+        device = rng.choice(DEVICES)
+        suffix = rng.choice(["", "", " " + rng.choice(SUBROLES).lower(), " backplane utility"])
+        ws.append([
+            "BOM", rng.choice(["1", "1", "2", "3"]), f"PN{i:06d}", rng.choice("ABC"),
+            f"{device}{suffix} assembly {i}", "Component", None, None, rng.randint(1, 8), i + 1,
+        ])
+
+def _table_sheet(wb, rng, name, rows, header_offset, blank_tail, mapping, blank_cols=0):
+    # header_offset：表头（Row Nbr）之前的标题行数（至少包含Title/Version/Device/Subrole几行）；
+    # blank_tail：表尾只有格式没有值的行数；blank_cols：表格右侧只有格式没有值的列数
+    ws = wb.create_sheet(name)
+    preamble = [["Title", name], ["Version", str(rng.randint(1, 5))]]
+    if mapping:
+        preamble += [["Device Type", rng.choice(DEVICES)], ["Subrole", rng.choice(SUBROLES)]]
+    preamble += [[] for _ in range(max(0, header_offset - len(preamble)))]
+    for row in preamble:
+        ws.append(row)
+    ws.append(MAPPING_COLUMNS)
+    for i in range(rows):
+        if i % 50 == 49:
+            ws.append([])  # 表中偶有空行
+            continue
+        ws.append([
+            i + 1, f"Slot {i % 16}", f"J{i % 40}", rng.choice(["x4", "x8", "x16"]),
+            f"{rng.choice(DEVICES)} {i}", rng.choice(["Front", "Rear", "Mid", None]),
+            None if i % 3 else "check",
+        ])
+    last = ws.max_row
+    for r in range(last + 1, last + 1 + blank_tail):
+        for c in range(1, len(MAPPING_COLUMNS) + 1):
+            ws.cell(row=r, column=c).fill = _BLANK_FILL
+    first_blank_col = len(MAPPING_COLUMNS) + 2
+    for r in range(header_offset + 1, last + 1):
+        for c in range(first_blank_col, first_blank_col + blank_cols):
+            ws.cell(row=r, column=c).fill = _BLANK_FILL
+
+def make_workbook(path, mapping_sheets=3, rows=500, bom_rows=500, blank_tail=0, header_offset=6, seed=0, item_number="P100200", blank_cols=0):
+    # mapping_sheets 为每种Mapping表的数量；另有Power、CFM各一张和一张不匹配的sheet
+    rng = random.Random(seed)
+    wb = Workbook()
+    _part_properties(wb, item_number)
+    _bom_report(wb, rng, bom_rows)
+    for idx in range(mapping_sheets):
+        for kind in MAPPING_KINDS:
+            name = kind if mapping_sheets == 1 else f"{kind} {idx + 1}"
+            _table_sheet(wb, rng, name, rows, header_offset, blank_tail, True, blank_cols)
+    _table_sheet(wb, rng, "Power", rows, header_offset, blank_tail, False, blank_cols)
+    _table_sheet(wb, rng, "CFM", rows, header_offset, blank_tail, False, blank_cols)
+    wb.create_sheet("Revision History").append(["Rev", "Date", "Author"])
+    wb.save(path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic workbook with the same layout as real exports.")
+    parser.add_argument("path", help="output .xlsx path")
+    parser.add_argument("--mapping-sheets", type=int, default=3, help="sheets per mapping kind (Storage/PCIe/Memory)")
+    parser.add_argument("--rows", type=int, default=500, help="table rows per sheet")
+    parser.add_argument("--bom-rows", type=int, default=500, help="rows in the Bom Report")
+    parser.add_argument("--blank-tail", type=int, default=0, help="formatted but empty rows after each table")
+    parser.add_argument("--blank-cols", type=int, default=0, help="formatted but empty columns right of each table")
+    parser.add_argument("--header-offset", type=int, default=6, help="title rows before the Row Nbr header")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    make_workbook(
+        args.path, args.mapping_sheets, args.rows, args.bom_rows, args.blank_tail, args.header_offset, args.seed,
+        blank_cols=args.blank_cols
+    )
+
+
+if __name__ == "__main__":
+    main()
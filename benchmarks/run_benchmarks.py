@@ -0,0 +1,162 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_engine import build_zip, encode_exports, export_workbook, stream_workbook
+from generate_workbook import make_workbook
+from readers import READERS
+from stage_timer import StageTimer
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，只记录tracemalloc峰值
+    resource = None
+
+# 场景名 -> make_workbook 参数；每个场景只改变一个维度，方便定位变慢的步骤
+SCENARIOS = {
+    "baseline": dict(mapping_sheets=3, rows=500, bom_rows=500),
+    "many_sheets": dict(mapping_sheets=12, rows=300, bom_rows=500),
+    "long_sheets": dict(mapping_sheets=1, rows=20000, bom_rows=500),
+    "large_bom": dict(mapping_sheets=3, rows=500, bom_rows=20000),
+    "blank_tail": dict(mapping_sheets=3, rows=500, bom_rows=500, blank_tail=5000),
+    "blank_cols": dict(mapping_sheets=3, rows=500, bom_rows=500, blank_cols=100),
+    "header_offset": dict(mapping_sheets=3, rows=500, bom_rows=500, header_offset=28),
+}
+MODES = ("export", "stream")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_WORKBOOK_DIR = os.path.join(tempfile.gettempdir(), "json_exporter_bench")
+
+
+def workbook_path(workbook_dir, name, params):
+    # 生成过的工作簿按参数复用，参数变了文件名也变
+    tag = "_".join(f"{k}{v}" for k, v in sorted(params.items()))
+    path = os.path.join(workbook_dir, f"{name}_{tag}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(workbook_dir, exist_ok=True)
+        make_workbook(path + ".tmp.xlsx", **params)
+        os.replace(path + ".tmp.xlsx", path)
+    return path
+
+def run_once(data, mode, timer):
+    # 与页面/命令行相同的完整流程：导出 -> 序列化 -> ZIP，返回导出的行数
+    if mode == "stream":
+        def write_export(fname, chunks):
+            for _ in chunks:
+                pass
+        result = stream_workbook(data, write_export, timer=timer)
+    else:
+        result = export_workbook(data, timer=timer)
+        build_zip(encode_exports(result.json_files, timer=timer), timer=timer)
+    if result.error:
+        raise RuntimeError(result.error)
+    return sum(result.row_counts.values())
+
+def measure(path, mode, repeat):
+    # 在独立子进程中运行：计时取最快的一次，之后单独跑一次tracemalloc记录Python内存峰值
+    with open(path, "rb") as f:
+        data = f.read()
+    best = None
+    for _ in range(repeat):
+        timer = StageTimer()
+        start = time.perf_counter()
+        rows = run_once(data, mode, timer)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best["seconds"]:
+            best = {
+                "seconds": seconds,
+                "rows": rows,
+                "stages": {stage: round(total, 4) for stage, _, total, _, _ in timer.summary_rows()},
+            }
+    tracemalloc.start()
+    run_once(data, mode, StageTimer())
+    best["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    if resource is not None:
+        # Linux为KB，macOS为字节
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        best["peak_rss_mb"] = maxrss / 1024 / (1024 if sys.platform == "darwin" else 1)
+    best["input_mb"] = len(data) / 1024 / 1024
+    return best
+
+def compare(results, baseline, tolerance):
+    # 返回回归列表：耗时或内存峰值超过基线 (1 + tolerance) 倍
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("seconds", "peak_traced_mb"):
+            if base.get(metric) and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {current[metric]:.3f} vs baseline {base[metric]:.3f} (+{(current[metric] / base[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+def format_result(key, current, base):
+    change = ""
+    if base and base.get("seconds"):
+        change = f"{(current['seconds'] / base['seconds'] - 1) * 100:+6.1f}%"
+    slowest = max(current["stages"].items(), key=lambda item: item[1], default=("", 0))
+    return (
+        f"{key:<24} {current['seconds']:8.3f}s {change:>7} {current['rows'] / max(current['seconds'], 1e-9):9.0f} rows/s "
+        f"{current['peak_traced_mb']:8.1f} MB traced  slowest: {slowest[0]} {slowest[1]:.3f}s"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline on synthetic workbooks (no Streamlit server).")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="run only these scenarios (repeatable)")
+    parser.add_argument("-m", "--mode", action="append", choices=MODES, help="run only these modes (default: both)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per scenario, the fastest is kept (default: 3)")
+    parser.add_argument("--reader", choices=["auto", *READERS], help="spreadsheet reader backend to benchmark (default: auto)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown/memory growth before failing (default: 0.2 = 20%%)")
+    parser.add_argument("--workbook-dir", default=DEFAULT_WORKBOOK_DIR, help="where generated workbooks are kept between runs")
+    parser.add_argument("--json", help="also write the full results (including per-stage times) to this file")
+    args = parser.parse_args(argv)
+    if args.reader:
+        # 子进程继承环境变量
+        os.environ["JSON_EXPORTER_READER"] = args.reader
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    results = {}
+    # 每个场景用新的子进程，内存峰值互不影响
+    context = multiprocessing.get_context("spawn")
+    for name in args.scenario or sorted(SCENARIOS):
+        path = workbook_path(args.workbook_dir, name, SCENARIOS[name])
+        for mode in args.mode or MODES:
+            key = f"{name}/{mode}"
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[key] = pool.submit(measure, path, mode, max(1, args.repeat)).result()
+            print(format_result(key, results[key], baseline.get(key)), flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION " + line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
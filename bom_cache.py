@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# 进程内BOM缓存的内存上限（MB），0为不缓存
+DEFAULT_MAX_MB = 128
+
+
+@dataclass
+class BomTables:
+    # 一张Bom Report解析和建索引的结果，多个会话、线程只读共用（不要修改）
+    level1: object = None          # BOM Level=1 的表（ExportResult.bom_report_level1），读取失败时为None
+    message: str = None            # 读取BOM Level=1 的提示信息
+    bom_index: object = None       # extract_table 用的索引（BomIndex）
+    device_bom_index: object = None  # 按device查找用的索引（BomIndex）
+    nbytes: int = 0
+
+    def estimate_nbytes(self):
+        total = 0
+        if self.level1 is not None:
+            total += int(self.level1.memory_usage(index=True, deep=True).sum())
+        for index in (self.bom_index, self.device_bom_index):
+            if index is not None:
+                total += index.nbytes
+        self.nbytes = total
+        return total
+
+
+def grid_fingerprint(grid):
+    # 按单元格值计算的Bom Report指纹（workbook.grid 的结果，与读取器、所在工作簿无关）：
+    # 每列的空值位置加上非空值的拼接文本，按列整体处理
+    digest = hashlib.sha1(repr(grid.shape).encode("ascii"))
+    for c in range(grid.shape[1]):
+        col = grid.iloc[:, c]
+        isna = col.isna()
+        digest.update(isna.to_numpy().tobytes())
+        digest.update("\x1f".join(map(str, col[~isna].tolist())).encode("utf-8", "surrogatepass"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+class BomCache:
+    # 进程内所有会话和导出线程共享的BOM解析结果，按Bom Report内容指纹查找，
+    # 总大小超过 max_bytes 时淘汰最久未使用的条目。hits/misses/evictions 供监控。
+    # 同一个文件再次上传时用一级指纹（预扫描的CRC32）找到内容指纹，不必解析Bom Report
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._aliases = {}   # 一级指纹 -> 内容指纹
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        # JSON_EXPORTER_BOM_CACHE_MB
+        return cls(max_bytes=int(float(os.environ.get("JSON_EXPORTER_BOM_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024))
+
+    def get(self, key):
+        with self._lock:
+            tables = self._entries.get(key)
+            if tables is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tables
+
+    def resolve(self, part_key):
+        # 一级指纹对应的内容指纹，条目已淘汰或未知时返回None
+        with self._lock:
+            key = self._aliases.get(part_key)
+            return key if key in self._entries else None
+
+    def alias(self, part_key, key):
+        with self._lock:
+            if key in self._entries:
+                self._aliases[part_key] = key
+
+    def get_or_parse(self, key, parse):
+        # 返回 (BomTables, 是否命中)；同一个BOM同时只由一个线程解析，其他线程等待后直接共用
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                tables = self.get(key)
+                if tables is not None:
+                    return tables, True
+                tables = parse()
+                self.put(key, tables)
+                return tables, False
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+
+    def put(self, key, tables):
+        # 单个超过上限的条目不缓存
+        nbytes = tables.estimate_nbytes()
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = tables
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+                self._aliases = {k: v for k, v in self._aliases.items() if v != evicted_key}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_bom_cache():
+    # 进程内唯一的BOM缓存（页面的所有会话、后台导出线程共用）
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = BomCache.from_env()
+        return _shared
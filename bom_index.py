@@ -0,0 +1,89 @@
+import sys
+from bisect import bisect_right
+
+# 描述之间的分隔符，Excel单元格文本中不会出现，保证关键字不会跨行匹配
+_SEP = "\x00"
+
+
+class BomIndex:
+    # BOM Level 1 的查找索引：所有描述拼成一个长文本，用 str.find 在C层面扫描，
+    # 再按行起始偏移二分定位行号，结果按 (device, subrole) 缓存。
+    # 匹配规则与原先逐行 iterrows 完全一致：返回第一条满足条件的行。
+    def __init__(self, descriptions, part_numbers, ignore_case=True):
+        self.ignore_case = ignore_case
+        self._descs = [d.lower() for d in descriptions] if ignore_case else list(descriptions)
+        self._part_numbers = list(part_numbers)
+        self._starts = []
+        pos = 0
+        for d in self._descs:
+            self._starts.append(pos)
+            pos += len(d) + 1
+        self._text = _SEP.join(self._descs)
+        self._utility = None
+        self._memo = {}
+
+    def __len__(self):
+        return len(self._descs)
+
+    @property
+    def nbytes(self):
+        # 索引占用内存的估算（描述、拼接文本、Part Number和行偏移）
+        strings = sum(sys.getsizeof(v) for v in self._descs) + sum(sys.getsizeof(v) for v in self._part_numbers)
+        return strings + sys.getsizeof(self._text) + sys.getsizeof(self._starts) + 32 * len(self._starts)
+
+    @classmethod
+    def from_level1(cls, bom_df):
+        # bom_report_level1（已fillna）：描述小写匹配，对应 extract_table 的规则
+        n = len(bom_df)
+        descs = [str(v) for v in bom_df["Part Description"]] if "Part Description" in bom_df.columns else [""] * n
+        pns = [str(v) for v in bom_df["Part Number"]] if "Part Number" in bom_df.columns else [""] * n
+        return cls(descs, pns, ignore_case=True)
+
+    @classmethod
+    def from_bom_table(cls, bom_df):
+        # header=0 读取的Bom Report：区分大小写，对应 extract_device_child_parent 的规则
+        if not {"BOM Level", "Part Number", "Part Description"}.issubset(bom_df.columns):
+            return None
+        filtered = bom_df[bom_df["BOM Level"].astype(str).str.strip() == "1"]
+        descs = [str(v).strip() for v in filtered["Part Description"]]
+        pns = [str(v).strip() for v in filtered["Part Number"]]
+        return cls(descs, pns, ignore_case=False)
+
+    def _rows_containing(self, keyword):
+        # 依次产出包含keyword的行号（升序，每行只出一次）
+        text = self._text
+        find = text.find
+        pos = find(keyword)
+        while pos != -1:
+            row = bisect_right(self._starts, pos) - 1
+            yield row
+            if row + 1 >= len(self._starts):
+                return
+            pos = find(keyword, self._starts[row + 1])
+
+    def _has_utility(self, row):
+        if self._utility is None:
+            self._utility = set(self._rows_containing("utility"))
+        return row in self._utility
+
+    def first_match(self, device_kw, subrole_kw=""):
+        # 返回第一个描述包含device_kw且满足subrole规则的Part Number，没有则返回""
+        if not device_kw:
+            return ""
+        if self.ignore_case:
+            device_kw = device_kw.lower()
+        key = (device_kw, subrole_kw)
+        if key in self._memo:
+            return self._memo[key]
+        result = ""
+        for row in self._rows_containing(device_kw):
+            if subrole_kw:
+                if "utility" in subrole_kw:
+                    if not self._has_utility(row):
+                        continue
+                elif subrole_kw not in self._descs[row] or self._has_utility(row):
+                    continue
+            result = self._part_numbers[row]
+            break
+        self._memo[key] = result
+        return result
@@ -0,0 +1,878 @@
+import datetime
+import io
+import json
+import multiprocessing
+from json.encoder import encode_basestring
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，没有时紧凑模式用标准库json
+    orjson = None
+
+from bom_cache import BomTables, grid_fingerprint, shared_bom_cache
+from bom_index import BomIndex
+from large_files import is_large_file, spilled
+from label_scan import scan_labels
+from prescan import scan_workbook
+from result_cache import content_digest, file_digest
+from stage_timer import StageTimer
+from validation import TableValidator, validate_header, validate_rows
+from workbook_cache import WorkbookCache
+from zip_writer import write_zip
+
+# (关键字, 显示名)：sheet名包含关键字即匹配，Power要求表名完全等于power
+SHEET_KEYWORDS = [
+    ("Storage", "Storage Mapping"),
+    ("PCIe", "PCIe Slot Mapping"),
+    ("Memory", "Memory Mapping"),
+    ("Power", "Power"),
+    ("CFM", "CFM")
+]
+MAPPING_TABLES = ["Storage Mapping", "PCIe Slot Mapping", "Memory Mapping"]
+INFO_FIELDS = [
+    "Item Number",
+    "Part Class Path",
+    "Part Description",
+    "Part Revision",
+    "Business Group",
+    "Role",
+    "Subrole",
+    "Generation",
+    "Processor Type"
+]
+BOM_FIELDS = [
+    "BOM/Substitute BOM?",
+    "BOM Level",
+    "Part Number",
+    "Part Revision",
+    "Part Description",
+    "Part Classification",
+    "MSF IDs",
+    "Substitutes",
+    "BOM Quantity"
+]
+DEFAULT_ZIP_NAME = "All_JSON_Exports.zip"
+MISSING_PART_PROPERTIES = "No 'Part Properties' sheet found in this Excel file."
+# 输出内容或格式有变化时需要升级，持久化缓存按此版本区分（1.5：Rows改为TableRows存储，1.6：Rows校验warning，
+# 1.7：增量导出的一级指纹 part_keys）
+EXPORTER_VERSION = "1.7"
+# ExportResult.fingerprints 中Part Properties/BOM Report输入的指纹
+INPUTS_KEY = ""
+# 流式导出时Rows校验的批大小
+VALIDATE_BATCH_ROWS = 10000
+# 输出格式 -> 文件名后缀：records 为模板格式（每行一个 {列名: 值}），
+# columnar 为列名列表加每行一个值数组，ndjson 为第一行表头字段、之后每行一个对象
+OUTPUT_FORMATS = {"records": ".json", "columnar": ".columnar.json", "ndjson": ".ndjson"}
+# 并行提取时子进程内的工作簿和BOM索引（由 _init_sheet_worker 设置）
+_worker_state = {}
+
+
+@dataclass(eq=False)
+class TableRows:
+    # 表格的Rows：列名只存一份，每行为与columns对应的值列表（缺失为""）。
+    # 迭代、下标得到与 to_dict(orient="records") 相同的dict（按需生成），序列化时不生成dict。
+    # 流式导出时values是逐行读取的迭代器
+    columns: list
+    values: list
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return (dict(zip(self.columns, row)) for row in self.values)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [dict(zip(self.columns, row)) for row in self.values[idx]]
+        return dict(zip(self.columns, self.values[idx]))
+
+    def __eq__(self, other):
+        if isinstance(other, TableRows):
+            return self.columns == other.columns and self.values == other.values
+        return list(self) == other
+
+
+@dataclass
+class ExportChanges:
+    # 与上一次导出相比的文件变化（按文件名，忽略Generated On）；reused为直接沿用上次结果的sheet
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    reused: list = field(default_factory=list)
+
+    def __str__(self):
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed, "
+            f"{len(self.unchanged)} unchanged ({len(self.reused)} sheets reused)"
+        )
+
+
+@dataclass
+class ExportResult:
+    part_properties_info: pd.DataFrame = None   # Name/Value 两列
+    bom_report_level1: pd.DataFrame = None      # BOM Level=1 的行
+    json_files: dict = field(default_factory=dict)      # 流式导出时只含表头字段（不含Rows）
+    row_counts: dict = field(default_factory=dict)      # 文件名 -> Rows行数
+    preview_tabs: list = field(default_factory=list)   # (display_name, sheet, content, fname)
+    json_warnings: list = field(default_factory=list)  # 主字段缺失和Rows校验（validation.ExportWarning）
+    messages: list = field(default_factory=list)       # BOM/sheet 级别的提示
+    error: str = None                                   # 致命错误（缺少Part Properties）
+    timings: list = field(default_factory=list)        # 各阶段的 StageRecord（计时报告）
+    fingerprints: dict = field(default_factory=dict)   # 增量导出：sheet名 -> 按值的指纹（未算出时为None），INPUTS_KEY 为输入的指纹
+    part_keys: dict = field(default_factory=dict)      # 增量导出：sheet名 -> 一级指纹（WorkbookCache.part_key）
+    sheet_results: dict = field(default_factory=dict)  # 增量导出：(display_name, sheet) -> (content, err, warnings)
+    changes: ExportChanges = None                       # 与上一次导出的比较（传入previous时）
+
+    def refresh_generated_on(self, generated_on):
+        # 缓存命中时只更新生成时间（json_files与preview_tabs共用同一份content）
+        for content in self.json_files.values():
+            content["Generated On"] = generated_on
+
+
+def get_info_fields(df, info_fields):
+    # 前30行第一列为字段名、第二列为值，重复字段以最后一个为准
+    return scan_labels(df, info_fields=info_fields, find_device=False).info
+
+def get_generated_on(xls=None, uploaded_file=None):
+    # 统一返回当前时刻，格式为m/d/Y h:M:S AM/PM（兼容Windows，去掉-）
+    now = datetime.datetime.now()
+    # %I 是12小时制，去除前导零
+    hour = str(int(now.strftime("%I")))
+    formatted = now.strftime(f"%m/%d/%Y {hour}:%M:%S %p")
+    # 去除月日的前导零
+    if formatted.startswith("0"): formatted = formatted[1:]
+    formatted = formatted.replace("/0", "/")
+    return formatted
+
+def extract_table(sheet_name, workbook, info, generated_on, table_name, filename, extra_fields=None, bom_index=None, warnings=None):
+    try:
+        labels = workbook.labels(sheet_name, find_device=False)
+        # 只找 row nbr
+        header_row_idx = labels.header_row
+        if header_row_idx is None:
+            return None, f"Suspected sheet but no matching table found (missing 'row nbr'): {sheet_name}"
+        # 只读取表格区域：表头覆盖的列，到最后一个带值的行为止
+        columns, values = table_rows(table_region_rows(workbook, sheet_name, header_row_idx), header_row_idx)
+        rows = TableRows(columns, list(values))
+
+        json_dict = build_json_header(sheet_name, labels, info, generated_on, table_name, extra_fields, bom_index, warnings)
+        json_dict["Rows"] = rows
+        return json_dict, None
+    except Exception as e:
+        return None, str(e)
+
+def table_region_rows(workbook, sheet_name, header_row_idx):
+    # 表格区域的行：先读到表头行确定列数，再从头逐行读取，只读这些列。
+    # 表头之前的行也要读，dtype=str 的列内转换规则与前面的行有关
+    header_row = None
+    for i, row in enumerate(workbook.iter_rows(sheet_name)):
+        if i == header_row_idx:
+            header_row = row
+            break
+    if header_row is None:
+        return
+    ncols = len(table_columns(["nan" if v is None else v for v in header_row]))
+    yield from workbook.iter_rows(sheet_name, max_col=max(ncols, 1))
+
+def table_columns(header_row):
+    # 表头从第一列开始，遇到空列停止，包含Notes列后停止
+    valid_cols = []
+    for idx, col in enumerate(header_row):
+        col_str = str(col).strip()
+        if col_str == "" or col_str == "nan":
+            break
+        valid_cols.append(idx)
+        if col_str == "Notes":
+            break
+    return valid_cols
+
+def build_json_header(sheet_name, labels, info, generated_on, table_name, extra_fields=None, bom_index=None, warnings=None):
+    # 生成Rows之前的所有字段，顺序与模板一致
+    # 检查主字段缺失并收集warning
+    # 提取Version字段（所有类型都支持）
+    version_val = labels.version if labels.version is not None else "1"
+    if table_name in ["CFM", "Power"]:
+        main_fields = ["Document Number", "Document Revision", "Part Number", "Role", "Subrole"]
+        json_main = {
+            "Document Number": info.get("Item Number", ""),
+            "Document Revision": info.get("Part Revision", ""),
+            "Part Number": extra_fields["Part Number"] if extra_fields and "Part Number" in extra_fields else "",
+            "Role": info.get("Role", ""),
+            "Subrole": info.get("Subrole", ""),
+        }
+    else:
+        main_fields = ["Document Number", "Document Revision", "Child Part Number", "Parent Part Number", "Device", "Role", "Subrole"]
+        # 提取Subrole、Child Part Number
+        subrole_header = labels.subrole if labels.subrole is not None else ""
+        child_part_number = ""
+        try:
+            device_kw = str(extra_fields["Device"]).strip() if extra_fields and "Device" in extra_fields else ""
+            subrole_kw = subrole_header.strip().lower() if subrole_header else ""
+            if bom_index is not None and device_kw:
+                # 第一条描述包含device且满足subrole规则（utility/非utility）的BOM行
+                child_part_number = bom_index.first_match(device_kw, subrole_kw)
+        except Exception:
+            child_part_number = extra_fields["Child Part Number"] if extra_fields and "Child Part Number" in extra_fields else ""
+        json_main = {
+            "Document Number": info.get("Item Number", ""),
+            "Document Revision": info.get("Part Revision", ""),
+            "Child Part Number": child_part_number,
+            "Parent Part Number": extra_fields["Parent Part Number"] if extra_fields and "Parent Part Number" in extra_fields else "",
+            "Device": extra_fields["Device"] if extra_fields and "Device" in extra_fields else "",
+            "Role": info.get("Role", ""),
+            "Subrole": subrole_header,
+        }
+
+    # 收集主字段为空或为nan的warning
+    if warnings is not None:
+        if table_name in ["CFM", "Power"]:
+            main_fields = [k for k in main_fields if k != "Part Number"]
+        warnings.extend(validate_header(sheet_name, json_main, main_fields))
+
+    return {
+        **json_main,
+        "TableName": table_name,
+        "Version": version_val,
+        "Generated On": generated_on,
+    }
+
+def stream_table(sheet_name, workbook, info, generated_on, table_name, extra_fields=None, bom_index=None, warnings=None):
+    # extract_table 的流式版本：返回 (表头字段, TableRows) 或 (None, 错误信息)。
+    # TableRows.values 逐行读取sheet，内存占用与行数无关
+    try:
+        labels = workbook.labels(sheet_name, find_device=False)
+        if labels.header_row is None:
+            return None, f"Suspected sheet but no matching table found (missing 'row nbr'): {sheet_name}"
+        header = build_json_header(sheet_name, labels, info, generated_on, table_name, extra_fields, bom_index, warnings)
+        columns, values = table_rows(table_region_rows(workbook, sheet_name, labels.header_row), labels.header_row)
+        return header, TableRows(columns, values)
+    except Exception as e:
+        return None, str(e)
+
+def table_rows(rows, header_row_idx):
+    # 返回 (列名, 值列表的迭代器)，与整表读取后 dropna(how="all").fillna("") 再 to_dict(orient="records") 的结果一致：
+    # 重名列只保留第一次出现的位置，值取最后一个同名列（与 dict(zip(...)) 相同）
+    rows = iter(rows)
+    header_row = []
+    for i, row in enumerate(rows):
+        if i == header_row_idx:
+            header_row = ["nan" if v is None else v for v in row]
+            break
+    valid_cols = table_columns(header_row)
+    picks = {}
+    for c in valid_cols:
+        picks[header_row[c]] = c
+    columns = list(picks)
+
+    def values():
+        for row in rows:
+            if all(row[c] is None for c in valid_cols if c < len(row)):
+                continue
+            yield ["" if c >= len(row) or row[c] is None else row[c] for c in picks.values()]
+
+    return columns, values()
+
+def extract_device_child_parent(sheet_name, workbook, info, bom_index=None):
+    # 遍历sheet所有单元格，模糊查找包含'device'的单元格，取右侧的值
+    device_val = ""
+    try:
+        device_val = workbook.labels(sheet_name).device or ""
+    except Exception:
+        device_val = ""
+    parent_part_number = info.get("Item Number", "")
+    child_part_number = ""
+    if device_val and bom_index is not None:
+        child_part_number = bom_index.first_match(device_val)
+    return device_val, parent_part_number, child_part_number
+
+def get_sheet_by_keyword(xls, keyword):
+    # 返回第一个包含keyword（不区分大小写）的sheet名
+    for name in xls.sheet_names:
+        if keyword.lower() in name.lower():
+            return name
+    return None
+
+def match_sheets(sheet_names):
+    # 返回 [(display_name, sheet_name)]，按sheet顺序
+    matched_sheets = []
+    for sheet_name in sheet_names:
+        for kw, display_name in SHEET_KEYWORDS:
+            if display_name == "Power":
+                # 只有表名等于Power（忽略大小写）才匹配
+                if sheet_name.strip().lower() == "power":
+                    matched_sheets.append((display_name, sheet_name))
+            else:
+                if kw.lower() in sheet_name.lower():
+                    matched_sheets.append((display_name, sheet_name))
+    return matched_sheets
+
+def read_bom_level1(workbook):
+    # 返回 (BOM Level=1 的表, 提示信息)
+    try:
+        # 先不指定header，读取原始数据
+        raw_bom = workbook.grid("Bom Report")
+        header_row_idx = None
+        for i in range(len(raw_bom)):
+            first_cell = str(raw_bom.iloc[i,0]).strip()
+            if first_cell == "BOM/Substitute BOM?":
+                header_row_idx = i
+                break
+        if header_row_idx is None:
+            return None, "BOM Report header (BOM/Substitute BOM?) not found."
+        bom_df = workbook.table("Bom Report", header_row_idx).rename(columns=lambda c: str(c).strip())
+        # 只保留BOM Level=1的行
+        if "BOM Level" in bom_df.columns:
+            filtered_bom = bom_df[bom_df["BOM Level"].astype(str).str.strip() == "1"]
+        else:
+            filtered_bom = bom_df.iloc[0:0]  # 空表
+        # 只保留需要的列
+        return filtered_bom[[c for c in BOM_FIELDS if c in filtered_bom.columns]].fillna(""), None
+    except Exception as e:
+        return None, f"Failed to read BOM Report: {e}"
+
+def unique_filename(content, sheet, json_files):
+    # 统一文件名格式：CFM/Power不带subrole，其他带subrole，且保证文件名唯一
+    doc_num = content.get("Document Number", "")
+    doc_rev = content.get("Document Revision", "")
+    table_name_val = content.get("TableName", "")
+    if table_name_val in ["CFM", "Power"]:
+        base_fname = f"{doc_num}_Rev{doc_rev}_{table_name_val}.json"
+    else:
+        subrole_val = content.get("Subrole", "")
+        base_fname = f"{doc_num}_Rev{doc_rev}_{table_name_val}_{subrole_val}.json"
+    # 保证文件名唯一，如有重名自动加sheet名或序号
+    fname = base_fname
+    if fname in json_files:
+        # 若sheet名已在文件名中则不再重复加
+        sheet_tag = str(sheet).replace(' ', '_').replace('/', '_')
+        alt_fname = f"{base_fname.rsplit('.json',1)[0]}_{sheet_tag}.json"
+        idx2 = 2
+        while alt_fname in json_files:
+            alt_fname = f"{base_fname.rsplit('.json',1)[0]}_{sheet_tag}{idx2}.json"
+            idx2 += 1
+        fname = alt_fname
+    return fname
+
+def sheet_table_args(workbook, display_name, sheet, info, device_bom_index=None):
+    # 返回 (table_name, extra_fields)：Mapping类表先找Device/Parent/Child，CFM/Power只有Part Number
+    if display_name in MAPPING_TABLES:
+        device, parent, child = extract_device_child_parent(sheet, workbook, info, device_bom_index)
+        extra = {"Device": device, "Parent Part Number": parent, "Child Part Number": child}
+        table_name = display_name if display_name != "Memory Mapping" else "Memory Mappping"
+    else:
+        extra = {"Part Number": ""}
+        table_name = display_name
+    return table_name, extra
+
+def extract_sheet(workbook, display_name, sheet, info, generated_on, bom_index=None, device_bom_index=None, timer=None):
+    # 处理单个匹配sheet，返回 (content, err, warnings)；不修改任何共享状态，可在子进程中运行
+    timer = timer if timer is not None else StageTimer()
+    warnings = []
+    with timer.stage("Sheet read", sheet) as record:
+        # 标签扫描（流式，找齐即停）；读取失败时由 extract_table 返回错误信息
+        try:
+            workbook.labels(sheet, find_device=display_name in MAPPING_TABLES)
+            record.rows = workbook.row_estimate(sheet) or 0
+            record.bytes = workbook.sheet_size(sheet) or 0
+        except Exception:
+            pass
+    with timer.stage("Sheet extract", sheet) as record:
+        table_name, extra = sheet_table_args(workbook, display_name, sheet, info, device_bom_index)
+        content, err = extract_table(
+            sheet, workbook, info, generated_on,
+            table_name=table_name,
+            filename=None,  # filename参数不再用于命名
+            extra_fields=extra,
+            bom_index=bom_index,
+            warnings=warnings
+        )
+        if content:
+            record.rows = len(content["Rows"])
+    if content:
+        with timer.stage("Validate", sheet, rows=len(content["Rows"])):
+            warnings.extend(validate_rows(sheet, content["Rows"]))
+    return content, err, warnings
+
+def _init_sheet_worker(source, backend, bom_index, device_bom_index, hash_rows=False):
+    # 每个子进程只打开一次工作簿（与主进程使用同一个读取器，按需解析sheet）；
+    # 大文件模式下只传文件路径，子进程各自memory map同一个文件
+    _worker_state["workbook"] = WorkbookCache(source, backend)
+    _worker_state["workbook"].hash_rows = hash_rows
+    _worker_state["bom_index"] = bom_index
+    _worker_state["device_bom_index"] = device_bom_index
+
+def _extract_sheet_in_worker(display_name, sheet, info, generated_on):
+    # 子进程中的计时记录、提取时顺便算出的指纹（增量导出）随结果一起返回，由主进程合并
+    timer = StageTimer()
+    workbook = _worker_state["workbook"]
+    content, err, warnings = extract_sheet(
+        workbook, display_name, sheet, info, generated_on,
+        _worker_state["bom_index"], _worker_state["device_bom_index"], timer
+    )
+    return content, err, warnings, timer.records, workbook.read_fingerprint(sheet) if workbook.hash_rows else None
+
+def dumps_json(content, compact=False, fmt="records"):
+    # 下载与ZIP使用同一种序列化格式；compact为无缩进的紧凑格式（装了orjson时用orjson）。
+    # Rows为TableRows时按fmt逐行拼接（records与直接json.dumps的结果完全相同）
+    rows = content.get("Rows") if isinstance(content, dict) else None
+    if isinstance(rows, TableRows):
+        header = {k: v for k, v in content.items() if k != "Rows"}
+        return "".join(iter_export_chunks(header, rows, fmt, compact))
+    if compact:
+        if orjson is not None:
+            return orjson.dumps(content).decode("utf-8")
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(content, ensure_ascii=False, indent=4)
+
+def export_filename(fname, fmt="records"):
+    # 导出文件名都以.json结尾，按格式换成对应后缀
+    return fname.rsplit(".json", 1)[0] + OUTPUT_FORMATS[fmt]
+
+def encode_exports(json_files, compact=False, timer=None, fmt="records"):
+    # 生成时每个导出只序列化一次，单文件下载和ZIP共用这份bytes；返回 {按格式的文件名: bytes}
+    timer = timer if timer is not None else StageTimer()
+    outputs = {}
+    for fname, content in json_files.items():
+        with timer.stage("Serialize", fname, rows=len(content.get("Rows", []))) as record:
+            payload = dumps_json(content, compact, fmt).encode("utf-8")
+            outputs[export_filename(fname, fmt)] = payload
+            record.bytes = len(payload)
+    return outputs
+
+def iter_export_chunks(header, rows, fmt="records", compact=False, batch_rows=1000):
+    # 逐段产出一个导出文件的文本，rows为TableRows（values可以是迭代器）。
+    # 每列的键名只编码一次，每行直接拼接编码后的值，不生成dict：
+    # records 与 dumps_json({**header, "Rows": list(rows)}, compact) 完全相同；
+    # columnar 为表头字段加 "Columns"/"Rows"（缩进时每行一个数组占一行）；ndjson 忽略compact
+    keys = [encode_basestring(c) for c in rows.columns]
+    if fmt == "ndjson":
+        head = dumps_json(header, compact=True) + "\n"
+        first, sep, close, empty = "", "", "", ""
+        prefixes = [("{" if k == 0 else ",") + key + ":" for k, key in enumerate(keys)]
+        item = lambda row: "".join([p + encode_basestring(v) for p, v in zip(prefixes, row)]) + "}\n" if row else "{}\n"
+    elif fmt == "columnar":
+        if compact:
+            head = dumps_json({**header, "Columns": list(rows.columns), "Rows": []}, compact=True)[:-len("]}")]
+            first, sep, close, empty = "", ",", "]}", "]}"
+            item = lambda row: "[" + ",".join([encode_basestring(v) for v in row]) + "]"
+        else:
+            head = dumps_json({**header, "Columns": [], "Rows": []})[:-len('[],\n    "Rows": []\n}')]
+            head += "[" + ", ".join(keys) + '],\n    "Rows": ['
+            first, sep, close, empty = "\n        ", ",\n        ", "\n    ]\n}", "]\n}"
+            item = lambda row: "[" + ", ".join([encode_basestring(v) for v in row]) + "]"
+    elif fmt == "records":
+        if compact:
+            head = dumps_json({**header, "Rows": []}, compact=True)[:-len("]}")]
+            first, sep, close, empty = "", ",", "]}", "]}"
+            prefixes = [("{" if k == 0 else ",") + key + ":" for k, key in enumerate(keys)]
+            item = lambda row: "".join([p + encode_basestring(v) for p, v in zip(prefixes, row)]) + "}" if row else "{}"
+        else:
+            head = dumps_json({**header, "Rows": []})[:-len("]\n}")]
+            first, sep, close, empty = "\n        ", ",\n        ", "\n    ]\n}", "]\n}"
+            prefixes = [("{" if k == 0 else ",") + "\n            " + key + ": " for k, key in enumerate(keys)]
+            item = lambda row: "".join([p + encode_basestring(v) for p, v in zip(prefixes, row)]) + "\n        }" if row else "{}"
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+    yield head
+    batch = []
+    count = 0
+    for row in rows.values:
+        batch.append((sep if count else first) + item(row))
+        count += 1
+        if len(batch) >= batch_rows:
+            yield "".join(batch)
+            batch = []
+    yield "".join(batch) + (close if count else empty)
+
+def zip_filename(part_info):
+    # ZIP名优先用Item Number，否则用默认名
+    item_number = None
+    if part_info is not None:
+        try:
+            # part_info是DataFrame，列名应为'Name'和'Value'
+            item_row = part_info[part_info['Name'] == 'Item Number']
+            if not item_row.empty:
+                val = item_row.iloc[0]['Value']
+                if val and val != "N/A":
+                    item_number = str(val).strip()
+        except Exception:
+            pass
+    if item_number:
+        return f"{item_number}.zip"
+    return DEFAULT_ZIP_NAME
+
+def build_zip(json_files, fileobj=None, timer=None, level=None, workers=None):
+    # json_files 的值可以是已序列化的bytes（encode_exports的结果），也可以是原始content。
+    # 成员在线程中并行压缩；level/workers 默认取 JSON_EXPORTER_ZIP_LEVEL / JSON_EXPORTER_ZIP_THREADS
+    timer = timer if timer is not None else StageTimer()
+    buf = fileobj if fileobj is not None else io.BytesIO()
+
+    def members():
+        for fname, content in json_files.items():
+            payload = content if isinstance(content, (bytes, str)) else dumps_json(content)
+            payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+            record.bytes += len(payload)
+            yield fname, payload
+
+    with timer.stage("ZIP", f"{len(json_files)} files") as record:
+        write_zip(members(), buf, level, workers)
+    buf.seek(0)
+    return buf
+
+def read_part_properties(workbook, result):
+    # Step 1：读取Part Properties信息字段，表格写入result
+    info = get_info_fields(workbook.grid("Part Properties"), INFO_FIELDS)
+    # 构建左右两列的表格，左为字段，右为值
+    result.part_properties_info = pd.DataFrame({"Name": INFO_FIELDS, "Value": [info.get(k, "N/A") for k in INFO_FIELDS]})
+    return info
+
+def parse_bom_tables(workbook):
+    # 读取BOM Level=1并建立两种查找索引
+    tables = BomTables()
+    tables.level1, tables.message = read_bom_level1(workbook)
+    if tables.level1 is not None:
+        tables.bom_index = BomIndex.from_level1(tables.level1)
+    # 按device查Child Part Number用的BOM索引（header=0读取，区分大小写），整个上传只建一次
+    tables.device_bom_index = BomIndex.from_bom_table(
+        workbook.table("Bom Report", 0).rename(columns=lambda c: str(c).strip())
+    )
+    return tables
+
+def read_bom_indexes(workbook, result, bom_cache=None):
+    # Step 2：读取BOM Level=1，返回 (extract_table用的索引, 按device查找用的索引, 是否命中BOM缓存, Bom Report的内容指纹)。
+    # 相同内容的Bom Report（不论来自哪个工作簿、哪个会话）只解析一次，结果在进程内共用；
+    # 同一个文件再次上传时按一级指纹找到缓存，不解析Bom Report，也不计算内容指纹
+    bom_cache = bom_cache if bom_cache is not None else shared_bom_cache()
+    if "Bom Report" not in workbook:
+        result.messages.append("No 'Bom Report' sheet found in this Excel file.")
+        return None, None, False, None
+    part_key = workbook.part_key("Bom Report")
+    key = bom_cache.resolve(part_key) if part_key is not None else None
+    if key is None:
+        try:
+            key = grid_fingerprint(workbook.grid("Bom Report"))
+        except Exception as e:
+            # 与 read_bom_level1 相同：Bom Report读取失败时只提示，继续导出（不做BOM查找）
+            result.messages.append(f"Failed to read BOM Report: {e}")
+            return None, None, False, None
+    tables, hit = bom_cache.get_or_parse(key, lambda: parse_bom_tables(workbook))
+    if part_key is not None:
+        bom_cache.alias(part_key, key)
+    result.bom_report_level1 = tables.level1
+    if tables.message:
+        result.messages.append(tables.message)
+    return tables.bom_index, tables.device_bom_index, hit, key
+
+def inputs_fingerprint(workbook, timer, bom_key=None):
+    # 增量导出：Part Properties与BOM Report合为一个输入指纹（影响所有sheet的表头字段和BOM查找）；
+    # bom_key 为 read_bom_indexes 得到的Bom Report内容指纹
+    with timer.stage("Fingerprint", "Part Properties + Bom Report"):
+        inputs = [EXPORTER_VERSION, workbook.fingerprint("Part Properties")]
+        if bom_key is not None:
+            inputs.append(bom_key)
+        return content_digest("\n".join(inputs).encode("utf-8"))
+
+def sheet_fingerprint(workbook, sheet, timer):
+    # 读取失败的sheet返回None（不沿用，由提取步骤报错）
+    with timer.stage("Fingerprint", sheet) as record:
+        try:
+            fingerprint = workbook.fingerprint(sheet)
+        except Exception:
+            return None
+        record.rows = workbook.row_estimate(sheet) or 0
+        return fingerprint
+
+def sheet_unchanged(previous, result, workbook, display_name, sheet, timer):
+    # 增量导出：sheet与上次相同时返回True，并记下它的指纹。一级指纹（预扫描的CRC32）相同时不读取sheet；
+    # 不同但sheet XML未变（如其他sheet改了文本，sharedStrings变化）时才按值计算指纹比较；
+    # 其他情况返回False，重新提取时顺便计算指纹
+    part_key = result.part_keys[sheet] = workbook.part_key(sheet)
+    if previous is None or (display_name, sheet) not in previous.sheet_results:
+        return False
+    if previous.fingerprints.get(INPUTS_KEY) != result.fingerprints[INPUTS_KEY]:
+        return False
+    previous_key = previous.part_keys.get(sheet)
+    if part_key is not None and part_key == previous_key:
+        result.fingerprints[sheet] = previous.fingerprints.get(sheet)
+        return True
+    if previous.fingerprints.get(sheet) is None:
+        return False
+    if part_key is not None and (previous_key is None or part_key[:2] != previous_key[:2]):
+        return False
+    result.fingerprints[sheet] = sheet_fingerprint(workbook, sheet, timer)
+    return result.fingerprints[sheet] is not None and result.fingerprints[sheet] == previous.fingerprints[sheet]
+
+def reuse_sheet_result(previous, display_name, sheet, generated_on):
+    # 沿用上次的 (content, err, warnings)，只更新Generated On
+    content, err, warnings = previous.sheet_results[(display_name, sheet)]
+    if content:
+        content = dict(content)
+        content["Generated On"] = generated_on
+    return content, err, warnings
+
+def diff_exports(previous, result, reused=()):
+    # 按文件名比较两次导出的JSON（忽略Generated On）
+    def strip(content):
+        return {k: v for k, v in content.items() if k != "Generated On"}
+
+    changes = ExportChanges(reused=list(reused))
+    for fname, content in result.json_files.items():
+        if fname not in previous.json_files:
+            changes.added.append(fname)
+        elif strip(previous.json_files[fname]) != strip(content):
+            changes.changed.append(fname)
+        else:
+            changes.unchanged.append(fname)
+    changes.removed = [fname for fname in previous.json_files if fname not in result.json_files]
+    return changes
+
+def eta_text(timer, remaining, workers=1):
+    eta = timer.eta(remaining, workers)
+    return "Estimating time left..." if eta is None else f"Estimated {eta:.0f}s left."
+
+def work_estimates(workbook, matched_sheets):
+    # 每个匹配sheet的 (预计行数, sheet XML字节数)，都不需要解析sheet，用于剩余时间估算和并行调度
+    return [(workbook.row_estimate(sheet), workbook.sheet_size(sheet)) for _, sheet in matched_sheets]
+
+def open_workbook(source, timer, bounded=False):
+    # 返回 (WorkbookCache, None)；xlsx先只读包的元数据（预扫描），缺少Part Properties时不打开工作簿，
+    # 直接返回 (None, 错误信息)。bounded 见 WorkbookCache
+    if isinstance(source, WorkbookCache):
+        return source, None
+    with timer.stage("Prescan") as record:
+        scan = scan_workbook(source)
+        if scan is not None:
+            record.detail = f"{len(scan.sheets)} sheets"
+            record.bytes = sum(sheet.size for sheet in scan.sheets)
+    if scan is not None and "Part Properties" not in scan:
+        return None, MISSING_PART_PROPERTIES
+    with timer.stage("Open workbook") as record:
+        workbook = WorkbookCache(source, scan=scan, bounded=bounded)
+        record.detail = workbook.reader.name
+        record.bytes = workbook.size
+    return workbook, None
+
+def export_cached(data, cache, digest=None, **kwargs):
+    # 先查内容哈希缓存，命中时不解析工作簿，只刷新Generated On；未命中则导出并写入缓存。
+    # data 为bytes或文件路径；达到大文件大小的bytes先写入临时文件，按memory map读取
+    if digest is None:
+        digest = content_digest(data) if isinstance(data, (bytes, bytearray)) else file_digest(data)
+    timer = kwargs.setdefault("timer", StageTimer.from_env())
+    with timer.stage("Cache lookup", digest[:12]):
+        result = cache.get(digest) if cache is not None else None
+    if result is not None:
+        result.refresh_generated_on(get_generated_on())
+        # 计时报告只反映本次运行
+        result.timings = timer.records
+        previous = kwargs.get("previous")
+        result.changes = diff_exports(previous, result) if previous is not None else None
+        return result
+    if isinstance(data, (bytes, bytearray)) and is_large_file(len(data)):
+        with spilled(data) as path:
+            result = export_workbook(path, **kwargs)
+    else:
+        result = export_workbook(data, **kwargs)
+    if cache is not None:
+        cache.put(digest, result)
+    return result
+
+def export_workbook(source, progress=None, sheet_workers=0, timer=None, incremental=False, previous=None):
+    # 完整流水线：Part Properties -> BOM Report -> 所有匹配sheet生成JSON
+    # progress(fraction, text) 用于进度条，可为空（命令行模式）
+    # sheet_workers > 1 时匹配sheet分发到进程池并行提取，结果仍按sheet原顺序合并
+    # timer 记录各阶段耗时（结果的 timings），剩余时间按实测的每行/每个sheet耗时估算
+    # incremental 时记录每个sheet的指纹；previous（上一次的ExportResult）的输入未变时只重新提取有变化的sheet，
+    # 并在结果的 changes 中列出新增/变化/删除的文件
+    def report(value, text):
+        if progress is not None:
+            progress(value, text=text)
+
+    timer = timer if timer is not None else StageTimer.from_env()
+    result = ExportResult(timings=timer.records)
+    workbook, result.error = open_workbook(source, timer)
+    if workbook is None:
+        return result
+    matched_sheets = match_sheets(workbook.sheet_names)
+    # 进度条总步数：Part Properties + BOM Report + 所有matched_sheets
+    total_steps = 2 + len(matched_sheets)
+    processed_steps = 0
+    # 每个匹配sheet的预计行数和XML大小（不解析sheet），用于剩余时间估算
+    estimates = work_estimates(workbook, matched_sheets)
+
+    # Step 1: Part Properties
+    if "Part Properties" not in workbook:
+        result.error = MISSING_PART_PROPERTIES
+        return result
+    with timer.stage("Part Properties", "Part Properties") as record:
+        info = read_part_properties(workbook, result)
+        record.rows = len(workbook.grid("Part Properties"))
+    processed_steps += 1
+    report(processed_steps/total_steps, f"Step 1/Part Properties info displayed. {eta_text(timer, estimates)}")
+
+    # Step 2: BOM Report
+    with timer.stage("BOM header", "Bom Report") as record:
+        bom_index, device_bom_index, cached, bom_key = read_bom_indexes(workbook, result)
+        if "Bom Report" in workbook:
+            record.rows = workbook.row_estimate("Bom Report") or 0
+            record.bytes = workbook.sheet_size("Bom Report") or 0
+            record.detail = "Bom Report (cached)" if cached else "Bom Report"
+    processed_steps += 1
+    report(processed_steps/total_steps, f"Step 2/BOM Report displayed. {eta_text(timer, estimates)}")
+
+    # Step 3: 遍历所有sheet生成JSON
+    generated_on = get_generated_on()
+    sheet_results = [None] * len(matched_sheets)
+    use_pool = sheet_workers and sheet_workers > 1 and len(matched_sheets) > 1
+    reused = []
+    if incremental:
+        result.fingerprints[INPUTS_KEY] = inputs_fingerprint(workbook, timer, bom_key)
+        workbook.hash_rows = True
+
+    def try_reuse(idx):
+        display_name, sheet = matched_sheets[idx]
+        if not sheet_unchanged(previous, result, workbook, display_name, sheet, timer):
+            return False
+        sheet_results[idx] = reuse_sheet_result(previous, display_name, sheet, generated_on)
+        reused.append(sheet)
+        return True
+
+    if incremental and use_pool:
+        # 并行时先比较所有sheet（一般只看一级指纹，不读取），只把有变化的sheet分发出去
+        for idx in range(len(matched_sheets)):
+            try_reuse(idx)
+        processed_steps += len(reused)
+    todo = [idx for idx, item in enumerate(sheet_results) if item is None]
+    if use_pool and len(todo) > 1:
+        workers = min(sheet_workers, len(todo))
+        # 页面中在多线程进程里调用（Streamlit服务线程、后台导出线程），fork可能继承其他线程持有的锁而死锁，用spawn
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_sheet_worker,
+            initargs=(workbook.source, workbook.reader.name, bom_index, device_bom_index, incremental)
+        ) as pool:
+            # 最大的sheet先提交（按预扫描的XML大小），避免最后只剩一个大sheet在跑
+            futures = {
+                pool.submit(_extract_sheet_in_worker, *matched_sheets[idx], info, generated_on): idx
+                for idx in sorted(todo, key=lambda i: estimates[i][1] or 0, reverse=True)
+            }
+            pending = set(todo)
+            try:
+                for done, future in enumerate(as_completed(futures)):
+                    idx = futures[future]
+                    content, err, warnings, timings, fingerprint = future.result()
+                    sheet_results[idx] = (content, err, warnings)
+                    timer.extend(timings)
+                    pending.discard(idx)
+                    display_name, sheet = matched_sheets[idx]
+                    if incremental and result.fingerprints.get(sheet) is None:
+                        result.fingerprints[sheet] = fingerprint
+                    report((processed_steps+done+1)/total_steps, f"Generated {display_name} ({sheet}) JSON. {eta_text(timer, [estimates[i] for i in pending], workers)}")
+            except BaseException:
+                # 出错或被取消（progress回调抛出异常）时不再启动排队中的sheet
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    else:
+        for done, idx in enumerate(todo):
+            display_name, sheet = matched_sheets[idx]
+            if incremental and not use_pool and try_reuse(idx):
+                continue
+            current_msg = f"Generating {display_name} ({sheet}) JSON..."
+            report((processed_steps+done)/total_steps, f"{current_msg} {eta_text(timer, [estimates[i] for i in todo[done:]])}")
+            sheet_results[idx] = extract_sheet(workbook, display_name, sheet, info, generated_on, bom_index, device_bom_index, timer)
+            if incremental and result.fingerprints.get(sheet) is None:
+                result.fingerprints[sheet] = workbook.read_fingerprint(sheet)
+
+    # 按sheet原顺序合并，保证重名文件的后缀和预览顺序稳定
+    for (display_name, sheet), (content, err, warnings) in zip(matched_sheets, sheet_results):
+        if incremental:
+            result.sheet_results[(display_name, sheet)] = (content, err, warnings)
+        result.json_warnings.extend(warnings)
+        if content:
+            fname = unique_filename(content, sheet, result.json_files)
+            result.json_files[fname] = content
+            result.row_counts[fname] = len(content["Rows"])
+            result.preview_tabs.append((display_name, sheet, content, fname))
+        else:
+            result.messages.append(f"{sheet}: {err}")
+    if previous is not None:
+        result.changes = diff_exports(previous, result, reused)
+    # 进度条100%
+    report(1.0, "All JSON files generated!")
+    return result
+
+def stream_workbook(source, write_export, progress=None, compact=False, timer=None, fmt="records"):
+    # 流式导出：匹配sheet逐行读取、逐段序列化，write_export(fname, chunks) 负责把文本片段写入文件或ZIP成员
+    # （fname为按fmt的文件名，json_files/row_counts仍以.json文件名为键）。
+    # 输出内容与 export_workbook + encode_exports 完全一致；xlsx用openpyxl只读模式逐行读取，内存占用与行数无关
+    def report(value, text):
+        if progress is not None:
+            progress(value, text=text)
+
+    timer = timer if timer is not None else StageTimer.from_env()
+    result = ExportResult(timings=timer.records)
+    workbook, result.error = open_workbook(source, timer, bounded=True)
+    if workbook is None:
+        return result
+    matched_sheets = match_sheets(workbook.sheet_names)
+    estimates = work_estimates(workbook, matched_sheets)
+    if "Part Properties" not in workbook:
+        result.error = MISSING_PART_PROPERTIES
+        return result
+    with timer.stage("Part Properties", "Part Properties") as record:
+        info = read_part_properties(workbook, result)
+        record.rows = len(workbook.grid("Part Properties"))
+    with timer.stage("BOM header", "Bom Report") as record:
+        bom_index, device_bom_index, cached, _ = read_bom_indexes(workbook, result)
+        if "Bom Report" in workbook:
+            record.rows = workbook.row_estimate("Bom Report") or 0
+            record.bytes = workbook.sheet_size("Bom Report") or 0
+            record.detail = "Bom Report (cached)" if cached else "Bom Report"
+
+    generated_on = get_generated_on()
+    for idx, (display_name, sheet) in enumerate(matched_sheets):
+        report(idx/max(len(matched_sheets), 1), f"Generating {display_name} ({sheet}) JSON... {eta_text(timer, estimates[idx:])}")
+        # 读取、提取、序列化在流式导出中交织进行，合计为一个阶段
+        with timer.stage("Sheet stream", sheet, bytes=workbook.sheet_size(sheet) or 0) as record:
+            table_name, extra = sheet_table_args(workbook, display_name, sheet, info, device_bom_index)
+            header, rows = stream_table(
+                sheet, workbook, info, generated_on,
+                table_name=table_name,
+                extra_fields=extra,
+                bom_index=bom_index,
+                warnings=result.json_warnings
+            )
+            if header is None:
+                result.messages.append(f"{sheet}: {rows}")
+                continue
+            fname = unique_filename(header, sheet, result.json_files)
+            counter = [0]
+            validator = TableValidator(sheet, rows.columns)
+            def counted(values=rows.values):
+                # 逐行计数，每 VALIDATE_BATCH_ROWS 行校验一批
+                batch = []
+                for row in values:
+                    counter[0] += 1
+                    batch.append(row)
+                    if len(batch) == VALIDATE_BATCH_ROWS:
+                        validator.update(batch)
+                        batch = []
+                    yield row
+                validator.update(batch)
+            rows.values = counted()
+            try:
+                result.json_files[fname] = header
+                write_export(export_filename(fname, fmt), iter_export_chunks(header, rows, fmt, compact))
+                result.row_counts[fname] = counter[0]
+                result.json_warnings.extend(validator.warnings())
+            except Exception as e:
+                del result.json_files[fname]
+                result.messages.append(f"{sheet}: {e}")
+            record.rows = counter[0]
+    report(1.0, "All JSON files generated!")
+    return result
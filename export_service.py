@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import parse_qs, quote, urlsplit
+
+from bom_cache import shared_bom_cache
+from export_engine import EXPORTER_VERSION, OUTPUT_FORMATS, build_zip, encode_exports, export_cached, export_filename, zip_filename
+from result_cache import ResultCache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_UPLOAD_MB = 200
+DEFAULT_MAX_PENDING = 20
+# 延迟分位数按最近这么多次导出计算
+LATENCY_WINDOW = 1000
+HEADER_TIMEOUT = 30
+BODY_TIMEOUT = 300
+_MAX_HEADER_BYTES = 64 * 1024
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+# 工作进程内的结果缓存（由 _init_worker 设置）
+_worker_state = {}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _init_worker(use_cache):
+    # 每个工作进程只创建一次磁盘结果缓存（与页面共用，同一工作簿不重复导出）
+    _worker_state["cache"] = ResultCache.from_env(version=EXPORTER_VERSION) if use_cache else None
+
+def run_export(data, fmt="records", compact=False, name=None):
+    # 在工作进程中运行，与页面相同的导出 -> 序列化 -> ZIP。
+    # 返回 ((状态码, Content-Type, 文件名, 内容, 提示数), (进程号, 该进程BOM缓存的统计))；
+    # name 为单个文件名时只返回该文件
+    response = _run_export(data, fmt, compact, name)
+    return response, (os.getpid(), shared_bom_cache().stats())
+
+def _run_export(data, fmt, compact, name):
+    result = export_cached(data, _worker_state.get("cache"))
+    if result.error:
+        return 422, "application/json", None, _json_bytes({"error": result.error}), 0
+    notices = len(result.json_warnings) + len(result.messages)
+    outputs = encode_exports(result.json_files, compact, fmt=fmt)
+    if name:
+        # 按格式的文件名或 .json 原名都可以
+        fname = name if name in outputs else export_filename(name, fmt) if name.endswith(".json") else None
+        if fname not in outputs:
+            return 404, "application/json", None, _json_bytes({"error": f"No export named {name}", "files": list(outputs)}), notices
+        content_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+        return 200, content_type, fname, outputs[fname], notices
+    if not outputs:
+        messages = result.messages or ["No JSON export file generated."]
+        return 422, "application/json", None, _json_bytes({"error": messages[0], "messages": messages}), 0
+    return 200, "application/zip", zip_filename(result.part_properties_info), build_zip(outputs).getvalue(), notices
+
+def _json_bytes(value):
+    return json.dumps(value, ensure_ascii=False, indent=2).encode("utf-8")
+
+def percentile(values, q):
+    # 最近邻秩分位数，values为已排序的列表
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+class ExportService:
+    # 本地HTTP导出服务：asyncio处理连接，CPU密集的导出交给有界的进程池。
+    #   POST /export[?file=名称&format=records|columnar|ndjson&compact=1]  请求体为工作簿（原始字节或multipart的file字段）
+    #   GET  /health   GET /metrics（排队深度、计数、延迟分位数、BOM缓存命中）
+    # 排队和运行中的导出超过 max_pending 时返回503，请求体超过 max_upload_bytes 时返回413
+    def __init__(self, workers=None, max_pending=DEFAULT_MAX_PENDING, max_upload_bytes=DEFAULT_MAX_UPLOAD_MB * 1024 * 1024, use_cache=True):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.max_upload_bytes = max_upload_bytes
+        # 服务进程里已有asyncio事件循环和线程，fork可能继承其他线程持有的锁而死锁，与sheet并行提取一样用spawn
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(use_cache,)
+        )
+        self.pending = 0
+        self.counters = {"requests": 0, "exports": 0, "failed": 0, "rejected": 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        # 每个工作进程有自己的BOM缓存：进程号 -> 最近一次导出后的统计
+        self.bom_cache_stats = {}
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        running = min(self.pending, self.workers)
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "running": running,
+            "queued": self.pending - running,
+            "max_pending": self.max_pending,
+            **self.counters,
+            "latency_seconds": {
+                "count": len(latencies),
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else None,
+            },
+            "bom_cache": {
+                key: sum(stats[key] for stats in self.bom_cache_stats.values())
+                for key in ("hits", "misses", "evictions", "entries", "bytes")
+            },
+        }
+
+    async def handle(self, reader, writer):
+        # 每个连接处理一个请求（Connection: close）
+        status, headers, body = 500, {}, b""
+        try:
+            status, headers, body = await self._dispatch(reader, writer)
+        except HttpError as e:
+            status, headers, body = e.status, e.headers, _json_bytes({"error": str(e)})
+        except Exception as e:
+            status, body = 500, _json_bytes({"error": str(e)})
+        headers.setdefault("Content-Type", "application/json")
+        try:
+            head = _response_head(status, headers, len(body))
+        except UnicodeEncodeError:
+            # 响应头只能是latin-1，无法编码时返回500，而不是直接断开连接
+            status, body = 500, _json_bytes({"error": "Response headers could not be encoded"})
+            head = _response_head(status, {"Content-Type": "application/json"}, len(body))
+        try:
+            writer.write(head + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader, writer):
+        try:
+            raw = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HttpError(408, "Timed out reading the request headers")
+        except asyncio.LimitOverrunError:
+            raise HttpError(431, "Request headers too large")
+        except asyncio.IncompleteReadError:
+            raise HttpError(400, "Incomplete request")
+        lines = raw.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        self.counters["requests"] += 1
+        if url.path == "/health":
+            return 200, {}, _json_bytes({"status": "ok", "version": EXPORTER_VERSION})
+        if url.path == "/metrics":
+            return 200, {}, _json_bytes(self.metrics())
+        if url.path != "/export":
+            raise HttpError(404, f"Unknown path: {url.path}")
+        if method != "POST":
+            raise HttpError(405, "Use POST to upload a workbook", {"Allow": "POST"})
+        return await self.export(reader, writer, headers, parse_qs(url.query))
+
+    async def export(self, reader, writer, headers, query):
+        start = time.perf_counter()
+        if "content-length" not in headers:
+            raise HttpError(411, "Content-Length is required (chunked uploads are not supported)")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > self.max_upload_bytes:
+            self.counters["rejected"] += 1
+            raise HttpError(413, f"Upload exceeds {self.max_upload_bytes // 1024 // 1024} MB")
+        fmt = query.get("format", ["records"])[0]
+        if fmt not in OUTPUT_FORMATS:
+            raise HttpError(400, f"Unknown format: {fmt} (use one of {', '.join(OUTPUT_FORMATS)})")
+        compact = query.get("compact", ["0"])[0].lower() in ("1", "true", "yes")
+        name = query.get("file", [None])[0]
+        # 先检查队列再读取请求体，繁忙时不接收大文件
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise HttpError(503, f"The export queue is full ({self.max_pending} exports)", {"Retry-After": "5"})
+        self.pending += 1
+        try:
+            if headers.get("expect", "").lower() == "100-continue":
+                # curl对较大的上传先等服务端确认
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HttpError(408, "Timed out reading the upload")
+            except asyncio.IncompleteReadError:
+                raise HttpError(400, "Upload shorter than Content-Length")
+            data = _upload_bytes(body, headers.get("content-type", ""))
+            (status, content_type, fname, payload, notices), (pid, bom_stats) = await asyncio.get_running_loop().run_in_executor(
+                self._pool, run_export, data, fmt, compact, name
+            )
+            self.bom_cache_stats[pid] = bom_stats
+        except HttpError:
+            self._failed(start)
+            raise
+        except BrokenProcessPool as e:
+            # 工作进程异常退出（如被系统杀掉）
+            self._failed(start)
+            raise HttpError(500, f"The export worker stopped unexpectedly: {e}")
+        except Exception as e:
+            # 导出中的其他异常：上传的文件无法读取（损坏、不是Excel工作簿等）
+            self._failed(start)
+            raise HttpError(422, f"Could not read the workbook: {e}")
+        finally:
+            self.pending -= 1
+        out_headers = {"Content-Type": content_type, "X-Export-Notices": str(notices)}
+        if fname:
+            out_headers["Content-Disposition"] = content_disposition(fname)
+        try:
+            _response_head(status, out_headers, len(payload))
+        except UnicodeEncodeError:
+            self._failed(start)
+            raise HttpError(500, "Response headers could not be encoded")
+        self.counters["exports" if status == 200 else "failed"] += 1
+        self.latencies.append(time.perf_counter() - start)
+        return status, out_headers, payload
+
+    def _failed(self, start):
+        # 失败的导出也计入延迟，/metrics 中的失败数和延迟覆盖所有导出请求
+        self.counters["failed"] += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle, host, port, limit=_MAX_HEADER_BYTES)
+        print(f"Export service listening on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def _response_head(status, headers, length):
+    head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in {**headers, "Content-Length": length, "Connection": "close"}.items())
+    return (head + "\r\n").encode("latin-1")
+
+def content_disposition(fname):
+    # 文件名可能含中文等非ASCII字符或引号：filename为ASCII的替代名，filename*为RFC 5987的UTF-8原名
+    fallback = "".join(c if " " <= c < "\x7f" and c not in '"\\' else "_" for c in fname)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(fname, safe='')}"
+
+def _upload_bytes(body, content_type):
+    # 请求体为工作簿原始字节，或 multipart/form-data 中名为file（或第一个带文件名）的字段
+    if not content_type.lower().startswith("multipart/form-data"):
+        if not body:
+            raise HttpError(400, "Empty upload")
+        return body
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    if not message.is_multipart():
+        raise HttpError(400, "Malformed multipart upload")
+    parts = list(message.iter_parts())
+    part = next((p for p in parts if p.get_param("name", header="content-disposition") == "file"), None)
+    part = part or next((p for p in parts if p.get_filename()), None)
+    if part is None:
+        raise HttpError(400, "No file field in the multipart upload")
+    return part.get_payload(decode=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the JSON exporter over HTTP on this machine (POST a workbook to /export, get the ZIP back).")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"interface to bind (default: {DEFAULT_HOST}, local only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT}, 0 = any free port)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="export worker processes (default: CPU count)")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_PENDING, help=f"queued plus running exports before answering 503 (default: {DEFAULT_MAX_PENDING})")
+    parser.add_argument("--max-upload-mb", type=float, default=DEFAULT_MAX_UPLOAD_MB, help=f"largest accepted workbook (default: {DEFAULT_MAX_UPLOAD_MB})")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the on-disk result cache")
+    args = parser.parse_args(argv)
+    service = ExportService(
+        workers=max(1, args.workers),
+        max_pending=max(1, args.max_queued),
+        max_upload_bytes=int(args.max_upload_mb * 1024 * 1024),
+        use_cache=not args.no_cache,
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+# 同时运行的导出任务数默认为CPU数的一半（每个任务还可能用子进程并行提取sheet）
+DEFAULT_MAX_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+DEFAULT_MAX_PENDING = 20
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass(eq=False)
+class ExportJob:
+    # 一个后台导出任务；状态和进度由工作线程更新，页面轮询读取
+    name: str                 # 上传的文件名
+    digest: str               # 文件内容哈希
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"    # queued / running / done / failed / cancelled（结果被页面释放且不在缓存中时为evicted）
+    progress: float = 0.0
+    text: str = "Queued"
+    result: object = None     # ExportResult
+    error: str = None
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def seconds(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def cancel(self):
+        # 排队中的任务不会开始；运行中的任务在下一次报告进度时停止（sheet之间）
+        self._cancel.set()
+        if self.status == "queued":
+            self.status = "cancelled"
+            self.text = "Cancelled"
+
+    def report(self, value, text=""):
+        # 作为导出的 progress 回调：已取消时抛出 JobCancelled 中止导出
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = value
+        self.text = text
+
+
+def latest_result(jobs, name):
+    # 同名上传（同一个工作簿的上一个版本）最近成功完成的导出结果，作为增量导出的基础；没有时返回None。
+    # 一次上传多个工作簿时不能拿另一个工作簿的结果比较
+    done = [
+        job for job in jobs
+        if job.name == name and job.status == "done" and job.result is not None and not job.result.error
+    ]
+    return max(done, key=lambda job: job.finished).result if done else None
+
+
+class JobQueue:
+    # 进程内所有会话共享的有界后台导出队列：最多 max_workers 个任务同时运行，
+    # 排队和运行中的任务超过 max_pending 时拒绝提交，繁忙时不会无限堆积
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export-job")
+        self._lock = threading.Lock()
+        self._jobs = []
+
+    @classmethod
+    def from_env(cls):
+        # JSON_EXPORTER_JOB_WORKERS / JSON_EXPORTER_MAX_QUEUED
+        return cls(
+            max_workers=max(1, int(os.environ.get("JSON_EXPORTER_JOB_WORKERS", DEFAULT_MAX_WORKERS))),
+            max_pending=max(1, int(os.environ.get("JSON_EXPORTER_MAX_QUEUED", DEFAULT_MAX_PENDING))),
+        )
+
+    @property
+    def sheet_workers(self):
+        # 每个任务并行提取sheet时可用的进程数：所有任务合计不超过CPU数
+        return max(1, (os.cpu_count() or 1) // self.max_workers)
+
+    def pending(self):
+        with self._lock:
+            self._jobs = [job for job in self._jobs if job.active]
+            return len(self._jobs)
+
+    def submit(self, job, fn, *args, **kwargs):
+        # 在后台线程中运行 fn(*args, progress=job.report, **kwargs)，返回值存入 job.result。
+        # 计数和加入在同一次加锁内完成，多个会话同时提交时也不会超过 max_pending
+        with self._lock:
+            self._jobs = [queued for queued in self._jobs if queued.active]
+            if len(self._jobs) >= self.max_pending:
+                raise QueueFull(f"The export queue is full ({self.max_pending} jobs); try again when some have finished.")
+            self._jobs.append(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job._cancel.is_set():
+            return
+        job.status = "running"
+        job.started = time.time()
+        job.text = "Starting..."
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.progress = 1.0
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+            job.text = "Cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            job.text = f"Failed: {e}"
+        finally:
+            job.finished = time.time()
@@ -0,0 +1,129 @@
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Version/Subrole/Info字段只在前30行查找
+HEAD_ROWS = 30
+# device可能在整张表任意位置，分块扫描，找到即停
+_DEVICE_CHUNK_ROWS = 4096
+_LABEL_RE = re.compile("version|subrole|device")
+
+
+@dataclass
+class SheetLabels:
+    header_row: int = None   # 第一列为 "row nbr" 的行号
+    version: str = None      # 包含 version 的单元格右侧的值（最后一个）
+    subrole: str = None      # 包含 subrole 的单元格右侧的值（最后一个）
+    device: str = None       # 包含 device 的单元格右侧的值（第一个）
+    info: dict = field(default_factory=dict)
+
+
+def _cell(values, i, j):
+    return str(values[i, j]).strip()
+
+
+def _lowered(block):
+    # 一次性把一块单元格转为小写字符串（NaN当作空串，不会匹配任何标签）
+    return pd.Series(block.ravel(), dtype=object).fillna("").astype(str).str.lower()
+
+
+def _label_hits(values, row_start, row_end):
+    # 返回 [(i, j, lowered_cell)]，按行优先顺序，只含可能的标签单元格（右侧必须有值列）
+    ncols = values.shape[1]
+    block = values[row_start:row_end, :ncols - 1]
+    if block.size == 0:
+        return []
+    lowered = _lowered(block)
+    hits = np.flatnonzero(lowered.str.contains(_LABEL_RE).to_numpy(dtype=bool))
+    width = ncols - 1
+    return [(row_start + k // width, k % width, lowered.iat[k]) for k in hits]
+
+
+def scan_labels(raw, info_fields=(), find_device=True):
+    # 一次扫描sheet，返回流水线需要的所有 标签→右侧值：
+    # Version/Subrole 保持“最后一个匹配生效”，Device 保持“第一个匹配生效”
+    values = raw.to_numpy(dtype=object)
+    nrows, ncols = values.shape
+    labels = SheetLabels()
+    if nrows == 0 or ncols == 0:
+        return labels
+
+    first_col = pd.Series(values[:, 0], dtype=object).astype(str).str.strip()
+    header_hits = np.flatnonzero((first_col.str.lower() == "row nbr").to_numpy(dtype=bool))
+    if len(header_hits):
+        labels.header_row = int(header_hits[0])
+
+    if info_fields:
+        head_keys = first_col.iloc[:HEAD_ROWS]
+        for i in np.flatnonzero(head_keys.isin(info_fields).to_numpy(dtype=bool)):
+            labels.info[head_keys.iat[i]] = _cell(values, i, 1) if ncols > 1 else ""
+
+    head_end = min(HEAD_ROWS, nrows)
+    for i, j, cell in _label_hits(values, 0, head_end):
+        if "version" in cell:
+            labels.version = _cell(values, i, j + 1)
+        if "subrole" in cell:
+            labels.subrole = _cell(values, i, j + 1)
+        if find_device and labels.device is None and "device" in cell:
+            labels.device = _cell(values, i, j + 1)
+
+    row_start = head_end
+    while find_device and labels.device is None and row_start < nrows:
+        row_end = min(row_start + _DEVICE_CHUNK_ROWS, nrows)
+        for i, j, cell in _label_hits(values, row_start, row_end):
+            if "device" in cell:
+                labels.device = _cell(values, i, j + 1)
+                break
+        row_start = row_end
+    return labels
+
+
+def scan_labels_rows(rows, find_device=True):
+    # scan_labels 的逐行版本，rows 为 iter_rows 产出的行（缺失值为None，行尾可能不等长）。
+    # 原网格宽度要读完整表才知道（最后一列的标签没有右侧值，不算匹配），
+    # 所以候选先暂存，宽度足够时即确认；全部确认后提前结束，不必读完整张表
+    labels = SheetLabels()
+    width = 0
+    head_hits = {"version": [], "subrole": []}   # [(j, value)]，前30行内按顺序
+    device_hits = []                              # [(j, value)]，直到第一个已确认的候选为止
+    for i, row in enumerate(rows):
+        width = max(width, len(row))
+        device_open = find_device and not any(j + 1 < width for j, _ in device_hits)
+        if row:
+            if labels.header_row is None and row[0] is not None and row[0].strip().lower() == "row nbr":
+                labels.header_row = i
+            if i < HEAD_ROWS or device_open:
+                text = "\x00".join(v for v in row if v is not None).lower()
+                if _LABEL_RE.search(text):
+                    for j, v in enumerate(row):
+                        if v is None:
+                            continue
+                        cell = v.lower()
+                        right = row[j + 1] if j + 1 < len(row) else None
+                        value = "nan" if right is None else right.strip()
+                        if i < HEAD_ROWS:
+                            for key, hits in head_hits.items():
+                                if key in cell:
+                                    hits.append((j, value))
+                        if device_open and "device" in cell:
+                            device_hits.append((j, value))
+                            if j + 1 < width:
+                                device_open = False
+        if (
+            i + 1 >= HEAD_ROWS
+            and labels.header_row is not None
+            and all(not hits or hits[-1][0] + 1 < width for hits in head_hits.values())
+            and (not find_device or (device_hits and device_hits[0][0] + 1 < width))
+        ):
+            break
+    for key, hits in head_hits.items():
+        confirmed = [value for j, value in hits if j + 1 < width]
+        if confirmed:
+            setattr(labels, key, confirmed[-1])
+    if find_device:
+        confirmed = [value for j, value in device_hits if j + 1 < width]
+        if confirmed:
+            labels.device = confirmed[0]
+    return labels
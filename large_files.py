@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# 上传文件达到此大小（MB）时进入大文件模式：写入临时文件，按memory map读取
+DEFAULT_LARGE_FILE_MB = 50
+# 每个会话保留导出结果、预览和下载数据的内存预算（MB），0为不限制
+DEFAULT_SESSION_BUDGET_MB = 512
+# "Download all"的ZIP超过此大小（MB）时从内存转存到临时文件
+DEFAULT_ZIP_SPOOL_MB = 16
+# 估算Rows内存时抽样的行数
+_SAMPLE_ROWS = 1000
+
+
+def _env_mb(name, default):
+    return int(float(os.environ.get(name, default)) * 1024 * 1024)
+
+def large_file_bytes():
+    # JSON_EXPORTER_LARGE_FILE_MB
+    return _env_mb("JSON_EXPORTER_LARGE_FILE_MB", DEFAULT_LARGE_FILE_MB)
+
+def session_budget_bytes():
+    # JSON_EXPORTER_SESSION_BUDGET_MB
+    return _env_mb("JSON_EXPORTER_SESSION_BUDGET_MB", DEFAULT_SESSION_BUDGET_MB)
+
+def zip_spool_bytes():
+    # JSON_EXPORTER_ZIP_SPOOL_MB
+    return _env_mb("JSON_EXPORTER_ZIP_SPOOL_MB", DEFAULT_ZIP_SPOOL_MB)
+
+def is_large_file(size):
+    return size >= large_file_bytes()
+
+def spool_dir():
+    # JSON_EXPORTER_SPOOL_DIR，默认系统临时目录下的 json_auto_exporter_uploads
+    directory = os.environ.get("JSON_EXPORTER_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "json_auto_exporter_uploads")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+@contextmanager
+def spilled(data, suffix=".xlsx"):
+    # 把上传的bytes写入临时文件，返回路径；导出按路径memory map读取（并行提取的子进程也只收到路径），
+    # 结束后删除
+    fd, path = tempfile.mkstemp(dir=spool_dir(), suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def spooled_zip():
+    # 小ZIP留在内存中，超过 zip_spool_bytes() 时写入 spool_dir() 下的临时文件（关闭或回收时删除）
+    return tempfile.SpooledTemporaryFile(max_size=zip_spool_bytes(), dir=spool_dir())
+
+def spooled_nbytes(f):
+    # spooled_zip() 占用的内存：已转存到磁盘时为0
+    size = f.seek(0, os.SEEK_END)
+    return size if size <= zip_spool_bytes() else 0
+
+def _rows_nbytes(rows):
+    # TableRows按抽样的行估算字符串和列表的内存，list of dict按dict估算
+    values = getattr(rows, "values", rows)
+    if not values:
+        return 0
+    sample = values[:_SAMPLE_ROWS]
+    per_row = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(v) for v in (row.values() if isinstance(row, dict) else row))
+        for row in sample
+    ) / len(sample)
+    return int(per_row * len(values))
+
+def result_nbytes(result):
+    # 导出结果在内存中的大致大小：各文件的Rows（json_files与preview_tabs共用同一份content，只算一次）
+    # 以及Part Properties、BOM Level=1两张表
+    total = 0
+    for content in result.json_files.values():
+        total += _rows_nbytes(content.get("Rows", []))
+    for df in (result.part_properties_info, result.bom_report_level1):
+        if df is not None:
+            total += int(df.memory_usage(index=True, deep=True).sum())
+    return total
+
+def outputs_nbytes(outputs):
+    # 已序列化的下载文件和内存中的ZIP
+    files = outputs.get("files") or {}
+    return sum(len(payload) for payload in files.values()) + outputs.get("zip_nbytes", 0)
@@ -0,0 +1,116 @@
+import os
+import posixpath
+import re
+import zipfile
+from dataclasses import dataclass, field
+from xml.etree import ElementTree
+
+from readers import open_source
+
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_OFFICE_DOCUMENT = _REL_NS + "/officeDocument"
+_WORKSHEET = _REL_NS + "/worksheet"
+_SHARED_STRINGS = _REL_NS + "/sharedStrings"
+_STYLES = _REL_NS + "/styles"
+# <dimension> 在sheet XML的开头（sheetData之前），只读前面一小段
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\s+ref="([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?"')
+_HEAD_BYTES = 64 * 1024
+
+
+@dataclass
+class SheetPart:
+    name: str
+    part: str               # zip成员路径，如 xl/worksheets/sheet3.xml
+    size: int = 0           # 解压后的XML字节数
+    compressed: int = 0
+    dimension: str = None   # dimension记录（如 A1:G500），没有时为None
+    rows: int = None        # dimension的最后一行（可能包含只有格式的行）
+    crc: int = 0            # zip目录中的CRC32
+
+
+@dataclass
+class WorkbookScan:
+    # xlsx包的元数据：按工作簿顺序的worksheet及其XML大小，不解析任何单元格
+    sheets: list = field(default_factory=list)
+    # 所有sheet共用、影响单元格值的部件（workbook.xml及其sharedStrings、styles）的CRC32
+    shared_crcs: tuple = ()
+
+    @property
+    def sheet_names(self):
+        return [sheet.name for sheet in self.sheets]
+
+    def __contains__(self, sheet_name):
+        return any(sheet.name == sheet_name for sheet in self.sheets)
+
+    def sheet(self, sheet_name):
+        return next((sheet for sheet in self.sheets if sheet.name == sheet_name), None)
+
+    def size(self, sheet_name):
+        # sheet XML的解压后大小，作为提取工作量的估计；未知时返回None
+        sheet = self.sheet(sheet_name)
+        return sheet.size if sheet is not None else None
+
+    def part_key(self, sheet_name):
+        # 不读取单元格的一级指纹：sheet XML的CRC32和大小，加上共用部件的CRC32，相同则单元格的值相同
+        # （反之不一定，如其他sheet改了文本导致sharedStrings变化）；未知时返回None
+        sheet = self.sheet(sheet_name)
+        if sheet is None:
+            return None
+        return (sheet.crc, sheet.size, *self.shared_crcs)
+
+
+def _rels(archive, part):
+    # part 的关系文件：Id -> (Type, 包内绝对路径)
+    folder, name = posixpath.split(part)
+    rels_part = posixpath.join(folder, "_rels", name + ".rels")
+    if rels_part not in archive.NameToInfo:
+        return {}
+    root = ElementTree.fromstring(archive.read(rels_part))
+    rels = {}
+    for rel in root.iter(f"{{{_PKG_REL_NS}}}Relationship"):
+        target = rel.get("Target", "")
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+        rels[rel.get("Id")] = (rel.get("Type"), path)
+    return rels
+
+def _dimension(archive, part):
+    with archive.open(part) as f:
+        m = _DIMENSION_RE.search(f.read(_HEAD_BYTES))
+    if not m:
+        return None, None
+    ref = m.group(0).split(b'"')[1].decode("ascii")
+    last_row = m.group(4) or m.group(2)
+    return ref, int(last_row) if last_row else None
+
+def scan_workbook(source):
+    # 只读xlsx包的目录、workbook.xml及其关系、每个sheet开头的dimension，毫秒级完成。
+    # source 为bytes或文件路径；不是xlsx（如xls）或结构无法识别时返回None，调用方按原流程处理
+    if not isinstance(source, (bytes, bytearray, str, os.PathLike)):
+        return None
+    try:
+        with zipfile.ZipFile(open_source(source)) as archive:
+            workbook_part = next(
+                (path for rel_type, path in _rels(archive, "").values() if rel_type == _OFFICE_DOCUMENT),
+                "xl/workbook.xml"
+            )
+            rels = _rels(archive, workbook_part)
+            root = ElementTree.fromstring(archive.read(workbook_part))
+            shared = [path for rel_type, path in rels.values() if rel_type in (_SHARED_STRINGS, _STYLES)]
+            scan = WorkbookScan(shared_crcs=tuple(
+                archive.getinfo(path).CRC if path in archive.NameToInfo else 0 for path in [workbook_part, *sorted(shared)]
+            ))
+            for element in root.iter():
+                if not element.tag.endswith("}sheet"):
+                    continue
+                rel_type, part = rels.get(element.get(f"{{{_REL_NS}}}id"), (None, None))
+                # 图表sheet等不是工作表，读取器不会列出
+                if rel_type != _WORKSHEET or part not in archive.NameToInfo:
+                    continue
+                info = archive.getinfo(part)
+                sheet = SheetPart(element.get("name"), part, info.file_size, info.compress_size, crc=info.CRC)
+                sheet.dimension, sheet.rows = _dimension(archive, part)
+                scan.sheets.append(sheet)
+            return scan
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError, OSError, ValueError):
+        return None
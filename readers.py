@@ -0,0 +1,330 @@
+import datetime
+import io
+import mmap
+import os
+import re
+import zipfile
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+try:
+    import python_calamine
+except ImportError:  # 可选依赖，未安装时使用openpyxl读取
+    python_calamine = None
+
+# sheet XML中的行标签（可能带命名空间前缀，如 <x:row r="12">）
+_ROW_TAG_RE = re.compile(rb'<(\w+:)?row\b([^>]*)>')
+_ROW_NUMBER_RE = re.compile(rb'\br="(\d+)"')
+# 带值的单元格：<v> 数值/共享字符串/公式结果，<is> 内联字符串
+_VALUE_TAGS = (b"v>", b"v ", b"v/", b"is>", b"is ")
+# calamine与openpyxl读法不同的内容：错误值单元格（calamine读成空字符串，openpyxl为NaN），
+# 以及没有 xml:space="preserve" 的纯空白文本（openpyxl写出的 " " 等，calamine读成空字符串）
+_ERROR_CELL_TAGS = (b't="e"', b"t='e'")
+_BLANK_TEXT_RE = re.compile(rb"t>[ \t\r\n]+</")
+_SCAN_CHUNK = 256 * 1024
+
+
+class MappedFile(io.RawIOBase):
+    # 按memory map读取磁盘上的工作簿（大文件模式），内容在页缓存中按需换入，不占进程堆内存。
+    # 每个实例有自己的读取位置，同一个文件可以同时被多个读取器打开
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buf):
+        data = self._map[self._pos:self._pos + len(buf)]
+        buf[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._map)}[whence]
+        self._pos = max(0, base + pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._map.close()
+        super().close()
+
+
+def open_source(source):
+    # source 为工作簿的bytes或文件路径；返回可seek的二进制文件对象
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return MappedFile(source)
+
+def _convert_cell(cell):
+    # 与pandas的openpyxl读取器一致：空单元格为""，错误值为NaN，整数值的数字转为int
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if cell.value is None:
+        return ""
+    elif cell.data_type == TYPE_ERROR:
+        return np.nan
+    elif cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+def _convert_calamine(value):
+    # calamine的数字都是float，日期为date：转成与openpyxl读取器相同的int/datetime
+    if isinstance(value, float):
+        val = int(value)
+        return val if val == value else value
+    if type(value) is datetime.date:
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+def _to_str(value, seen):
+    # 与 dtype=str 的转换一致，缺失值返回None。
+    # pandas按列去重转换，同一列中 True/1、False/0 以先出现的写法为准
+    if isinstance(value, str):
+        return None if value in STR_NA_VALUES else value
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, bool) or (type(value) is int and value in (0, 1)):
+        return seen.setdefault(int(value), str(value))
+    return str(value)
+
+def _row_number(buf, pos):
+    m = _ROW_TAG_RE.match(buf, pos)
+    number = _ROW_NUMBER_RE.search(m.group(2)) if m else None
+    return int(number.group(1)) if number else None
+
+def last_value_row(stream, chunk_size=_SCAN_CHUNK):
+    # 只在sheet XML的字节上查找（不解析XML），返回最后一个带值单元格所在的行号（1起，没有值时为0）。
+    # 经过Excel格式化的表常带有大量只有格式没有值的行（dimension甚至是A1:XFD1048576），
+    # 读取时以此为界即可提前结束。行标签缺少行号时无法判断，返回None
+    last = 0
+    current = None   # 已扫描部分最后一个行标签的行号
+    prefix = None
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        buf = tail + chunk
+        # 末尾可能截断了一个标签，留到下一块
+        cut = buf.rfind(b"<") if chunk else -1
+        if cut == -1:
+            cut = len(buf)
+        scan, tail = buf[:cut], buf[cut:]
+        if prefix is None:
+            m = _ROW_TAG_RE.search(scan)
+            if m:
+                prefix = m.group(1) or b""
+        if prefix is not None:
+            end = scan.find(b"</" + prefix + b"sheetData>")
+            if end != -1:
+                scan, chunk = scan[:end], b""
+            value_pos = max(scan.rfind(b"<" + prefix + tag) for tag in _VALUE_TAGS)
+            if value_pos != -1:
+                row_pos = scan.rfind(b"<" + prefix + b"row", 0, value_pos)
+                row = current if row_pos == -1 else _row_number(scan, row_pos)
+                if row is None:
+                    return None
+                last = row
+            row_pos = scan.rfind(b"<" + prefix + b"row")
+            if row_pos != -1:
+                current = _row_number(scan, row_pos)
+        if not chunk:
+            return last
+
+def calamine_unsafe(stream, chunk_size=_SCAN_CHUNK):
+    # 在XML的字节上查找calamine会读错的内容（错误值单元格、纯空白的 <t> 文本）
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        buf = tail + chunk
+        if any(tag in buf for tag in _ERROR_CELL_TAGS):
+            return True
+        # 正则以字面量开头才快，命中后再确认是 <t> 或 <x:t> 标签
+        for m in _BLANK_TEXT_RE.finditer(buf):
+            if buf[m.start() - 1:m.start()] in (b"<", b":"):
+                return True
+        if not chunk:
+            return False
+        # 末尾可能截断了一个标签或一段 <t>...</t>，从倒数第二个 "<" 起留到下一块
+        last = buf.rfind(b"<")
+        cut = buf.rfind(b"<", 0, last) if last > 0 else -1
+        tail = b"" if last == -1 else buf[last if cut == -1 else cut:]
+
+def _trim_row(values):
+    # 与pandas读取器一致：去掉行尾的空单元格
+    while values and values[-1] == "":
+        values.pop()
+    return values
+
+def _rows_to_grid(rows):
+    # 逐行结果组装成与 read_excel(header=None, dtype=str) 相同的网格：去掉末尾空行，按最宽的行补齐
+    while rows and not rows[-1]:
+        rows.pop()
+    width = max((len(row) for row in rows), default=0)
+    data = [[np.nan if v is None else v for v in row] + [np.nan] * (width - len(row)) for row in rows]
+    return pd.DataFrame(data, columns=pd.RangeIndex(width), dtype=str)
+
+
+class PandasReader:
+    # 整表读取（pd.ExcelFile，引擎由pandas按文件类型选择），xls等其他读取器打不开的文件使用。
+    # 不支持逐行读取，WorkbookCache 对整表网格逐行迭代
+    name = "pandas"
+    streaming = False
+    engine = None
+
+    def __init__(self, source):
+        self._xls = pd.ExcelFile(open_source(source), engine=self.engine)
+        self.sheet_names = self._xls.sheet_names
+
+    def grid(self, sheet_name):
+        return self._xls.parse(sheet_name=sheet_name, header=None, dtype=str)
+
+    def row_estimate(self, sheet_name):
+        return None
+
+    def close(self):
+        self._xls.close()
+
+
+class OpenpyxlReader(PandasReader):
+    # openpyxl只读模式：xlsx只读取到最后一个带值的行，可逐行流式读取
+    name = "openpyxl"
+    streaming = True
+    engine = "openpyxl"
+
+    def __init__(self, source):
+        super().__init__(source)
+        self._source = source
+        self._scan = None
+        self._last_rows = {}
+
+    def last_row(self, sheet_name):
+        # 最后一个带值的行号（1起），无法判断时返回None。
+        # sheet XML按预扫描得到的包内路径自己打开，不依赖openpyxl的内部属性
+        if sheet_name not in self._last_rows:
+            from prescan import scan_workbook
+
+            if self._scan is None:
+                self._scan = scan_workbook(self._source) or False
+            sheet = self._scan.sheet(sheet_name) if self._scan else None
+            last = None
+            if sheet is not None:
+                try:
+                    with zipfile.ZipFile(open_source(self._source)) as archive, archive.open(sheet.part) as f:
+                        last = last_value_row(f)
+                except Exception:
+                    last = None
+            self._last_rows[sheet_name] = last
+        return self._last_rows[sheet_name]
+
+    def grid(self, sheet_name):
+        return self._xls.parse(sheet_name=sheet_name, header=None, dtype=str, nrows=self.last_row(sheet_name))
+
+    def row_estimate(self, sheet_name):
+        # 不解析sheet的行数估计：已扫描过时为最后一个带值的行，否则为dimension记录
+        if self._last_rows.get(sheet_name) is not None:
+            return self._last_rows[sheet_name]
+        try:
+            return self._xls.book[sheet_name].max_row
+        except Exception:
+            return None
+
+    def iter_rows(self, sheet_name, max_col=None):
+        last = self.last_row(sheet_name)
+        if last == 0:
+            return
+        sheet = self._xls.book[sheet_name]
+        sheet.reset_dimensions()
+        seen = defaultdict(dict)
+        for row in sheet.iter_rows(min_row=1, max_row=last, max_col=max_col):
+            converted = _trim_row([_convert_cell(cell) for cell in row])
+            yield [_to_str(v, seen[j]) for j, v in enumerate(converted)]
+
+
+class CalamineReader:
+    # python-calamine（Rust实现）读取xlsx，比openpyxl快数倍，只有格式没有值的单元格不会被读取。
+    # 个别内容calamine的读法与openpyxl不同（见 _ERROR_CELL_TAGS），含这些内容的工作簿不使用，保证输出一致。
+    # 逐行产出不生成整表网格，但sheet本身整张加载到内存，流式导出不使用（见 BOUNDED_ORDER）
+    name = "calamine"
+    streaming = True
+
+    def __init__(self, source):
+        if python_calamine is None:
+            raise ImportError("python-calamine is not installed")
+        if not zipfile.is_zipfile(open_source(source)):
+            raise ValueError("calamine reader only handles xlsx files")
+        with zipfile.ZipFile(open_source(source)) as archive:
+            for member in archive.namelist():
+                if member == "xl/sharedStrings.xml" or (member.startswith("xl/worksheets/") and member.endswith(".xml")):
+                    with archive.open(member) as f:
+                        if calamine_unsafe(f):
+                            raise ValueError(f"{member} has cells calamine reads differently")
+        # 文件路径直接交给calamine打开（按需读取zip成员）
+        self._book = python_calamine.load_workbook(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+        self.sheet_names = self._book.sheet_names
+        self._current = None
+
+    def _sheet(self, sheet_name):
+        # 加载sheet比逐行读取慢得多：同一sheet连续读取多次（指纹、标签扫描、行导出）时只加载一次，
+        # 只保留最近加载的一个sheet
+        if self._current is None or self._current[0] != sheet_name:
+            self._current = (sheet_name, self._book.get_sheet_by_name(sheet_name))
+        return self._current[1]
+
+    def grid(self, sheet_name):
+        return _rows_to_grid(list(self.iter_rows(sheet_name)))
+
+    def row_estimate(self, sheet_name):
+        # 行数要加载sheet才知道，交给ETA按每个sheet的平均耗时估算
+        return None
+
+    def iter_rows(self, sheet_name, max_col=None):
+        seen = defaultdict(dict)
+        for row in self._sheet(sheet_name).iter_rows():
+            row = row[:max_col] if max_col is not None else row
+            converted = _trim_row([_convert_calamine(v) for v in row])
+            yield [_to_str(v, seen[j]) for j, v in enumerate(converted)]
+
+    def close(self):
+        self._current = None
+        self._book.close()
+
+
+READERS = {"calamine": CalamineReader, "openpyxl": OpenpyxlReader, "pandas": PandasReader}
+# auto 时的尝试顺序：打不开（未安装、文件类型不支持、含calamine会读错的内容）就换下一个
+AUTO_ORDER = ("calamine", "openpyxl", "pandas")
+# 内存与行数无关的读取顺序（流式导出）：xlsx用openpyxl只读模式逐行解析，xls等仍由pandas整表读取
+BOUNDED_ORDER = ("openpyxl", "pandas")
+
+
+def open_reader(source, backend=None, bounded=False):
+    # source 为bytes或文件路径；backend 为 None 时取环境变量 JSON_EXPORTER_READER，默认 auto。
+    # bounded=True 时auto和calamine都改按 BOUNDED_ORDER 选择
+    backend = backend or os.environ.get("JSON_EXPORTER_READER") or "auto"
+    if backend not in READERS and backend != "auto":
+        raise ValueError(f"Unknown reader backend: {backend}")
+    order = AUTO_ORDER
+    if bounded and backend in ("auto", "calamine"):
+        order = BOUNDED_ORDER
+    elif backend != "auto":
+        return READERS[backend](source)
+    error = None
+    for name in order:
+        try:
+            return READERS[name](source)
+        except Exception as exc:
+            error = exc
+    raise error
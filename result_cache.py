@@ -0,0 +1,108 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "json_auto_exporter")
+DEFAULT_MAX_ENTRIES = 200
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+_SUFFIX = ".pkl"
+
+
+def content_digest(data):
+    # 工作簿内容的sha256，同一文件无论文件名/哪个会话上传都得到同一个key
+    return hashlib.sha256(data).hexdigest()
+
+def file_digest(path):
+    # 与 content_digest 相同，按块读取磁盘上的文件
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ResultCache:
+    # 按 (文件内容哈希, 导出器版本) 持久化导出结果到本地磁盘，所有会话共享。
+    # 超过条目数或总大小时按最近使用时间（文件mtime）淘汰最旧的条目。
+    def __init__(self, directory=None, version="", max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.version = version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, version=""):
+        # JSON_EXPORTER_CACHE_DIR / JSON_EXPORTER_CACHE_MAX_ENTRIES / JSON_EXPORTER_CACHE_MAX_MB
+        return cls(
+            directory=os.environ.get("JSON_EXPORTER_CACHE_DIR") or None,
+            version=version,
+            max_entries=int(os.environ.get("JSON_EXPORTER_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(float(os.environ.get("JSON_EXPORTER_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+        )
+
+    def _path(self, digest):
+        version = "".join(c if c.isalnum() or c in "._-" else "_" for c in str(self.version))
+        return os.path.join(self.directory, f"{digest}_{version}{_SUFFIX}")
+
+    def get(self, digest):
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 损坏或旧格式的条目直接丢弃
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # 记录最近使用时间，供LRU淘汰
+        except OSError:
+            pass
+        return value
+
+    def put(self, digest, value):
+        path = self._path(digest)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        # 先按条目数、再按总大小淘汰，最旧的先删
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(_SUFFIX):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+                _, size, path = entries.pop(0)
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(_SUFFIX):
+                    self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
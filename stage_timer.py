@@ -0,0 +1,145 @@
+import csv
+import io
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# 流水线各阶段的名称，计时报告按此顺序汇总
+STAGES = [
+    "Cache lookup",
+    "Prescan",
+    "Open workbook",
+    "Part Properties",
+    "BOM header",
+    "Fingerprint",
+    "Sheet read",
+    "Sheet extract",
+    "Validate",
+    "Sheet stream",
+    "Serialize",
+    "ZIP",
+]
+# 用于估算剩余时间的sheet级阶段（流式导出时读取和提取合在一起）
+SHEET_STAGES = ("Sheet read", "Sheet extract", "Sheet stream")
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    detail: str = ""      # sheet名或文件名
+    seconds: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+
+
+def format_record(record):
+    return f"[timing] {record.stage:<15} {record.detail:<40} {record.seconds:8.3f}s {record.rows:>9} rows {record.bytes:>12} bytes"
+
+
+class StageTimer:
+    # 记录每个阶段的耗时、行数和字节数：用于进度条的剩余时间估算，也可导出为计时报告。
+    # log 为可选的回调，每完成一个阶段调用一次（参数为一行文本）
+    def __init__(self, log=None):
+        self.records = []
+        self.log = log
+
+    @classmethod
+    def from_env(cls):
+        # JSON_EXPORTER_TIMING_LOG：设为文件路径时追加写入该文件，设为 - 时写到stderr
+        target = os.environ.get("JSON_EXPORTER_TIMING_LOG")
+        if not target:
+            return cls()
+        if target == "-":
+            return cls(log=lambda line: print(line, file=sys.stderr, flush=True))
+
+        def append(line):
+            with open(target, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        return cls(log=append)
+
+    @contextmanager
+    def stage(self, name, detail="", rows=0, bytes=0):
+        # with timer.stage(...) as record: 阶段内可以更新 record.rows / record.bytes
+        record = StageRecord(name, str(detail), rows=rows, bytes=bytes)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            self.add(record)
+
+    def add(self, record):
+        self.records.append(record)
+        if self.log is not None:
+            self.log(format_record(record))
+
+    def extend(self, records):
+        # 合并子进程中记录的阶段
+        for record in records:
+            self.add(record)
+
+    def eta(self, remaining, workers=1):
+        # remaining：每个待处理sheet的 (预计行数, sheet XML字节数)，未知为None；返回秒数，还无法估算时返回None。
+        # 已完成的阶段都记录了输入字节数（预扫描得到）时按实测每字节耗时估算，其次按每行耗时，
+        # 都未知的按实测每个sheet的平均耗时估算；还没有sheet完成时用BOM Report读取的耗时
+        # （Part Properties太小，不作参考）
+        sheet_records = [r for r in self.records if r.stage in SHEET_STAGES]
+        rate_records = sheet_records or [r for r in self.records if r.stage == "BOM header" and (r.rows or r.bytes)]
+        if not rate_records:
+            return None
+        seconds = sum(r.seconds for r in rate_records)
+        measured = [r for r in rate_records if r.stage != "Sheet extract"]
+        rows = sum(r.rows for r in measured)
+        per_row = seconds / rows if rows else None
+        size = sum(r.bytes for r in measured)
+        per_byte = seconds / size if size and all(r.bytes for r in measured) else None
+        sheets = len({r.detail for r in sheet_records})
+        per_sheet = seconds / sheets if sheets else None
+        total = 0.0
+        for n, nbytes in remaining:
+            if nbytes is not None and per_byte is not None:
+                total += nbytes * per_byte
+            elif n is not None and per_row is not None:
+                total += n * per_row
+            elif per_sheet is not None:
+                total += per_sheet
+        return total / max(1, min(workers, len(remaining)))
+
+    def summary_rows(self):
+        # 按阶段汇总：[(stage, count, seconds, rows, bytes)]
+        totals = {}
+        for r in self.records:
+            t = totals.setdefault(r.stage, [0, 0.0, 0, 0])
+            t[0] += 1
+            t[1] += r.seconds
+            t[2] += r.rows
+            t[3] += r.bytes
+        order = [s for s in STAGES if s in totals] + [s for s in totals if s not in STAGES]
+        return [(s, *totals[s]) for s in order]
+
+    def summary(self):
+        # 文本格式的汇总（命令行输出用）
+        lines = []
+        for stage, count, seconds, rows, size in self.summary_rows():
+            rate = f"{rows / seconds:.0f} rows/s" if rows and seconds else ""
+            lines.append(f"  {stage:<15} x{count:<4} {seconds:8.3f}s {rows:>9} rows {size / 1024 / 1024:9.2f} MB  {rate}")
+        return "\n".join(lines)
+
+    def report_csv(self):
+        # 计时报告：先是每条记录，再是按阶段的汇总
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(["stage", "detail", "seconds", "rows", "bytes", "rows_per_s", "mb_per_s"])
+        for r in self.records:
+            writer.writerow([r.stage, r.detail, *_rates(r.seconds, r.rows, r.bytes)])
+        for stage, count, seconds, rows, size in self.summary_rows():
+            writer.writerow([stage, f"TOTAL ({count})", *_rates(seconds, rows, size)])
+        return buf.getvalue()
+
+
+def _rates(seconds, rows, size):
+    rows_per_s = f"{rows / seconds:.0f}" if rows and seconds else ""
+    mb_per_s = f"{size / 1024 / 1024 / seconds:.2f}" if size and seconds else ""
+    return [f"{seconds:.4f}", rows, size, rows_per_s, mb_per_s]
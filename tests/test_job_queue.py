@@ -0,0 +1,67 @@
+import sys
+import threading
+from pathlib import Path
+
+import openpyxl
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from export_engine import export_workbook
+from generate_workbook import make_workbook
+from job_queue import ExportJob, JobQueue, QueueFull, latest_result
+
+
+def _submit(queue, jobs, name, data):
+    # 与页面的 submit_export_jobs 相同：以同名文件上一次的结果为基础增量导出，等待完成
+    job = ExportJob(name, name)
+    queue.submit(job, export_workbook, data, incremental=True, previous=latest_result(jobs, name))
+    jobs.append(job)
+    while job.active:
+        threading.Event().wait(0.05)
+    assert job.status == "done", job.error
+    return job.result
+
+
+def test_previous_result_is_chosen_per_workbook(tmp_path):
+    make_workbook(tmp_path / "a.xlsx", mapping_sheets=1, rows=50, bom_rows=20, item_number="P100200")
+    make_workbook(tmp_path / "b.xlsx", mapping_sheets=1, rows=50, bom_rows=20, item_number="P300400", seed=1)
+    wb = openpyxl.load_workbook(tmp_path / "a.xlsx")
+    wb["PCIe Mapping"]["B10"] = "Slot CHANGED"
+    wb.save(tmp_path / "a2.xlsx")
+    queue = JobQueue(max_workers=1)
+    jobs = []
+
+    first = _submit(queue, jobs, "A.xlsx", (tmp_path / "a.xlsx").read_bytes())
+    _submit(queue, jobs, "B.xlsx", (tmp_path / "b.xlsx").read_bytes())
+    assert latest_result(jobs, "A.xlsx") is first
+    assert latest_result(jobs, "C.xlsx") is None
+
+    # A的新版本与A上一次的结果比较（不是最近完成的B），只重新提取改过的sheet
+    revised = _submit(queue, jobs, "A.xlsx", (tmp_path / "a2.xlsx").read_bytes())
+    changes = revised.changes
+    assert changes.added == [] and changes.removed == []
+    assert len(changes.changed) == 1
+    assert len(changes.reused) == len(first.json_files) - 1
+    assert latest_result(jobs, "A.xlsx") is revised
+
+
+def test_submit_enforces_max_pending_across_threads():
+    queue = JobQueue(max_workers=1, max_pending=3)
+    release = threading.Event()
+    accepted, rejected = [], []
+
+    def submit():
+        try:
+            queue.submit(ExportJob("x.xlsx", "x"), lambda progress: release.wait())
+            accepted.append(1)
+        except QueueFull:
+            rejected.append(1)
+
+    threads = [threading.Thread(target=submit) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    release.set()
+    assert (len(accepted), len(rejected)) == (3, 17)
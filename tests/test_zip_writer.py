@@ -0,0 +1,55 @@
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import zip_writer
+from zip_writer import write_zip, zip_method
+
+MEMBERS = [
+    ("P100200_RevB_Power.json", b'{"Row Nbr": "1", "Slot": "J1"}\n' * 2000),
+    ("P100200_RevB_存储_ü.json", "中文内容".encode("utf-8") * 500),
+    ("empty.json", b""),
+]
+
+
+def _zip(members, level, workers=3):
+    buf = io.BytesIO()
+    write_zip(members, buf, level, workers)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("level", [0, 1, 6, 9])
+def test_archive_matches_zipfile_writestr(level):
+    data = _zip(MEMBERS, level)
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    assert archive.testzip() is None
+    assert [(name, archive.read(name)) for name in archive.namelist()] == MEMBERS
+    # 与 zipfile.writestr 写出的字节完全相同
+    expected = io.BytesIO()
+    with zipfile.ZipFile(expected, "w", zip_method(level)) as ref:
+        for name, payload in MEMBERS:
+            zinfo = zipfile.ZipInfo(name, archive.infolist()[0].date_time)
+            zinfo.external_attr = 0o600 << 16
+            zinfo.compress_type = zip_method(level)
+            ref.writestr(zinfo, payload, compresslevel=level or None)
+    assert data == expected.getvalue()
+
+
+def test_zip64_records(monkeypatch):
+    # 降低zip64阈值，不必生成超过2GB的数据
+    monkeypatch.setattr(zip_writer, "_ZIP64_LIMIT", 100)
+    archive = zipfile.ZipFile(io.BytesIO(_zip(MEMBERS, 6)))
+    assert archive.testzip() is None
+    assert [(name, archive.read(name)) for name in archive.namelist()] == MEMBERS
+
+
+def test_more_than_65535_members():
+    members = [(f"{i}.json", b"{}") for i in range(70000)]
+    archive = zipfile.ZipFile(io.BytesIO(_zip(members, 1, workers=2)))
+    assert archive.testzip() is None
+    assert len(archive.namelist()) == 70000
@@ -0,0 +1,129 @@
+import csv
+import io
+from dataclasses import dataclass
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+# warning代码：主字段为空 / 主字段为 nan 等缺失值的文本 / 表格列没有任何值 / row nbr为空或不是数字 /
+# row nbr重复 / row nbr不连续
+MISSING = "missing"
+NAN_VALUE = "nan_value"
+EMPTY_COLUMN = "empty_column"
+ROW_NBR_MISSING = "row_nbr_missing"
+DUPLICATE_ROW_NBR = "duplicate_row_nbr"
+ROW_NBR_SEQUENCE = "row_nbr_sequence"
+# 缺失值转成字符串后的样子（str(NaN/None/NaT/pd.NA)）
+NAN_LIKE = ("nan", "none", "null", "nat", "<na>")
+# 允许整列为空的表格列
+OPTIONAL_COLUMNS = ("Notes",)
+# status中最多列出的row nbr个数
+_MAX_LISTED = 5
+
+
+@dataclass(frozen=True)
+class ExportWarning:
+    # 结构化的warning，展示格式（HTML/文本）由调用方决定；code为上面的warning代码
+    sheet: str
+    field: str
+    status: str = "Missing"
+    code: str = MISSING
+
+    def __str__(self):
+        return f"Sheet: {self.sheet}  Field: {self.field}  Status: {self.status}"
+
+
+def validate_header(sheet_name, header, fields):
+    # header中fields的值为空或为nan等文本时各返回一条warning
+    warnings = []
+    for k in fields:
+        v = str(header.get(k, "")).strip()
+        if v == "":
+            warnings.append(ExportWarning(sheet_name, k))
+        elif v.lower() in NAN_LIKE:
+            warnings.append(ExportWarning(sheet_name, k, f"Missing ({v})", NAN_VALUE))
+    return warnings
+
+def _all_empty(values, i):
+    col = list(map(itemgetter(i), values))
+    return col.count("") == len(col)
+
+def _number(x):
+    return str(int(x)) if float(x).is_integer() else str(x)
+
+def _listed(values):
+    text = ", ".join(_number(v) for v in values[:_MAX_LISTED])
+    return text + (f" (+{len(values) - _MAX_LISTED} more)" if len(values) > _MAX_LISTED else "")
+
+
+class TableValidator:
+    # 逐批检查表格的Rows（与TableRows.values相同的值列表，缺失为""），每批按列整体处理，不逐格循环：
+    #   必填列（OPTIONAL_COLUMNS以外）在所有行中都为空
+    #   第一列为row nbr时，值为空或不是数字、数值重复、或不是逐行加1
+    #   （连续性按行的位置判断：500、空、502 只报空值，不报 500 -> 502）
+    # 整表一次 update 即可；流式导出时按批 update，最后调用 warnings()
+    def __init__(self, sheet_name, columns):
+        self.sheet_name = sheet_name
+        self.columns = list(columns)
+        self._unfilled = [i for i, c in enumerate(self.columns) if str(c).strip() not in OPTIONAL_COLUMNS]
+        self._has_row_nbr = bool(self.columns) and str(self.columns[0]).strip().lower() == "row nbr"
+        self._row_nbrs = []
+
+    def update(self, values):
+        if not values:
+            return
+        # 只取需要的列（map/itemgetter、list.count在C层面循环），首行或末行有值的列不必再取
+        self._unfilled = [i for i in self._unfilled if values[0][i] == "" == values[-1][i] and _all_empty(values, i)]
+        if self._has_row_nbr:
+            col = list(map(itemgetter(0), values))
+            try:
+                nbrs = np.fromiter(col, dtype=float, count=len(col))
+            except (TypeError, ValueError):
+                # 含空值或文本时逐个解析，无法解析的为NaN
+                nbrs = pd.to_numeric(pd.Series(col, dtype=object), errors="coerce").to_numpy(dtype=float)
+            self._row_nbrs.append(nbrs)
+
+    def warnings(self):
+        warnings = [ExportWarning(self.sheet_name, str(self.columns[i]), "Empty column", EMPTY_COLUMN) for i in self._unfilled]
+        if not self._row_nbrs:
+            return warnings
+        field = str(self.columns[0])
+        nbrs = np.concatenate(self._row_nbrs)
+        invalid = np.isnan(nbrs)
+        positions = np.flatnonzero(~invalid)
+        nbrs = nbrs[positions]
+        missing = np.flatnonzero(invalid)
+        if len(missing):
+            # 用前一个有效的row nbr指出位置
+            before = np.searchsorted(positions, missing[:_MAX_LISTED]) - 1
+            places = ", ".join(f"after {_number(nbrs[k])}" if k >= 0 else "at the start" for k in before)
+            more = f" (+{len(missing) - _MAX_LISTED} more)" if len(missing) > _MAX_LISTED else ""
+            warnings.append(ExportWarning(self.sheet_name, field, f"Empty or not a number in {len(missing)} rows: {places}{more}", ROW_NBR_MISSING))
+        breaks = np.flatnonzero(np.diff(nbrs) != np.diff(positions))
+        if len(breaks):
+            # 逐行加1时不可能重复，只有不连续时才需要排序查重
+            uniq, counts = np.unique(nbrs, return_counts=True)
+            duplicates = uniq[counts > 1]
+            if len(duplicates):
+                warnings.append(ExportWarning(self.sheet_name, field, f"Duplicate: {_listed(duplicates)}", DUPLICATE_ROW_NBR))
+            jumps = [f"{_number(nbrs[k])} -> {_number(nbrs[k + 1])}" for k in breaks[:_MAX_LISTED]]
+            more = f" (+{len(breaks) - _MAX_LISTED} more)" if len(breaks) > _MAX_LISTED else ""
+            warnings.append(ExportWarning(self.sheet_name, field, f"Not sequential: {', '.join(jumps)}{more}", ROW_NBR_SEQUENCE))
+        return warnings
+
+
+def validate_rows(sheet_name, rows):
+    # 整表检查：rows为TableRows
+    validator = TableValidator(sheet_name, rows.columns)
+    validator.update(rows.values)
+    return validator.warnings()
+
+def warnings_csv(warnings):
+    # 每条warning一行：Sheet, Field, Code, Status
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["Sheet", "Field", "Code", "Status"])
+    for w in warnings:
+        writer.writerow([w.sheet, w.field, w.code, w.status])
+    return buf.getvalue()
@@ -0,0 +1,163 @@
+import hashlib
+import os
+from collections import defaultdict
+
+import pandas as pd
+
+from label_scan import scan_labels, scan_labels_rows
+from prescan import scan_workbook
+from readers import open_reader
+
+
+def _row_bytes(row):
+    # 指纹中的一行（行尾空值已去掉）：按值拼接
+    return ("\x1f".join(["\x00" if v is None else v for v in row]) + "\x1e").encode("utf-8", "surrogatepass")
+
+def _dedup_columns(names):
+    # 与 pd.read_excel(header=n) 的列名规则一致：空表头为 "Unnamed: i"，重名依次加 .1/.2
+    cols = []
+    counts = defaultdict(int)
+    for i, name in enumerate(names):
+        col = f"Unnamed: {i}" if pd.isna(name) else name
+        cur_count = counts[col]
+        while cur_count > 0:
+            counts[col] = cur_count + 1
+            col = f"{col}.{cur_count}"
+            cur_count = counts[col]
+        cols.append(col)
+        counts[col] = cur_count + 1
+    return cols
+
+
+class WorkbookCache:
+    # 每次上传只打开一次工作簿，每个sheet只解析一次，各步骤共用同一份网格数据。
+    # 具体读取由 readers 中的读取器完成，xlsx只读取到最后一个带值的行；
+    # 读取器支持逐行读取时匹配sheet不整表解析，标签扫描和行导出都逐行流式读取
+    def __init__(self, source, backend=None, scan=None, bounded=False):
+        if isinstance(source, (str, os.PathLike)):
+            # 大文件模式：按路径memory map读取，不把整个文件读进内存
+            self.source = os.fspath(source)
+            self.size = os.path.getsize(self.source)
+        else:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                self.source = bytes(source)
+            else:
+                if hasattr(source, "seek"):
+                    source.seek(0)
+                self.source = source.getvalue() if hasattr(source, "getvalue") else source.read()
+            self.size = len(self.source)
+        # 原始字节（或路径）保留下来，供并行提取时在子进程中重新打开
+        # backend：calamine / openpyxl / pandas / auto；bounded 为流式导出，不用整张加载sheet的读取器（见 readers.open_reader）
+        self.reader = open_reader(self.source, backend, bounded)
+        self.sheet_names = self.reader.sheet_names
+        # xlsx包元数据的预扫描结果（prescan.WorkbookScan），未传入时首次用到再扫描
+        self._scan = scan
+        self._grids = {}
+        self._tables = {}
+        self._labels = {}
+        self._fingerprints = {}
+        # 增量导出时为True：逐行读完整张sheet（行导出）时顺便计算指纹，不必为指纹单独再读一遍
+        self.hash_rows = False
+
+    def __contains__(self, sheet_name):
+        return sheet_name in self.sheet_names
+
+    def grid(self, sheet_name):
+        # 等价于 pd.read_excel(sheet_name=..., header=None, dtype=str)，只读到最后一个带值的行
+        if sheet_name not in self._grids:
+            self._grids[sheet_name] = self.reader.grid(sheet_name)
+        return self._grids[sheet_name]
+
+    def table(self, sheet_name, header_row):
+        # 等价于 pd.read_excel(sheet_name=..., header=header_row, dtype=str)，直接从网格切片
+        key = (sheet_name, header_row)
+        if key not in self._tables:
+            raw = self.grid(sheet_name)
+            if raw.empty:
+                self._tables[key] = raw.copy()
+                return self._tables[key]
+            if header_row >= len(raw):
+                raise ValueError(f"Header row {header_row} out of range for sheet: {sheet_name}")
+            df = raw.iloc[header_row + 1:].reset_index(drop=True)
+            df.columns = _dedup_columns(raw.iloc[header_row].tolist())
+            self._tables[key] = df
+        return self._tables[key]
+
+    def row_estimate(self, sheet_name):
+        # 不解析sheet的行数估计，用于剩余时间估算；未知时返回None
+        if sheet_name in self._grids:
+            return len(self._grids[sheet_name])
+        return self.reader.row_estimate(sheet_name)
+
+    def _prescan(self):
+        # 非xlsx时为False
+        if self._scan is None:
+            self._scan = scan_workbook(self.source) or False
+        return self._scan
+
+    def sheet_size(self, sheet_name):
+        # sheet XML的解压后字节数（预扫描得到），作为工作量估计；非xlsx或未知时返回None
+        return self._prescan().size(sheet_name) if self._prescan() else None
+
+    def iter_rows(self, sheet_name, max_col=None):
+        # 逐行产出与 grid(sheet_name) 相同的值（str，缺失为None），不保留整张表；行尾空单元格已去掉。
+        # 读到最后一个带值的行即停止；max_col 限制只读前几列（表格区域之外的格式列不做转换）
+        if sheet_name in self._grids or not self.reader.streaming:
+            for row in self.grid(sheet_name).itertuples(index=False):
+                row = row[:max_col] if max_col is not None else row
+                yield [None if pd.isna(v) else v for v in row]
+            return
+        if not self.hash_rows or sheet_name in self._fingerprints:
+            yield from self.reader.iter_rows(sheet_name, max_col)
+            return
+        # 读取所有列计算指纹，再截到 max_col 列；中途停止（标签扫描找齐即停）时不记录
+        digest = hashlib.sha1()
+        for row in self.reader.iter_rows(sheet_name):
+            digest.update(_row_bytes(row))
+            if max_col is not None and len(row) > max_col:
+                row = row[:max_col]
+                while row and row[-1] is None:
+                    row.pop()
+            yield row
+        self._fingerprints[sheet_name] = digest.hexdigest()
+
+    def fingerprint(self, sheet_name):
+        # 按单元格值计算的sheet指纹（与读取器、共享字符串的顺序无关），值相同的sheet导出结果相同
+        if sheet_name not in self._fingerprints:
+            digest = hashlib.sha1()
+            if sheet_name in self._grids or not self.reader.streaming:
+                for row in self.grid(sheet_name).itertuples(index=False):
+                    row = [None if pd.isna(v) else v for v in row]
+                    while row and row[-1] is None:
+                        row.pop()
+                    digest.update(_row_bytes(row))
+            else:
+                for row in self.reader.iter_rows(sheet_name):
+                    digest.update(_row_bytes(row))
+            self._fingerprints[sheet_name] = digest.hexdigest()
+        return self._fingerprints[sheet_name]
+
+    def read_fingerprint(self, sheet_name):
+        # 不再额外读取sheet就能得到的指纹：已按整表读取，或逐行读取时已顺便算出；否则返回None
+        if sheet_name in self._fingerprints or sheet_name in self._grids or not self.reader.streaming:
+            return self.fingerprint(sheet_name)
+        return None
+
+    def part_key(self, sheet_name):
+        # 不读取单元格的一级指纹（预扫描的zip CRC32，见 prescan.WorkbookScan.part_key）；非xlsx时返回None
+        return self._prescan().part_key(sheet_name) if self._prescan() else None
+
+    def labels(self, sheet_name, find_device=True):
+        # 每个sheet只扫描一次标签；已做过完整扫描（含device）时直接复用
+        cached = self._labels.get(sheet_name)
+        if cached is None or (find_device and not cached[1]):
+            if self.reader.streaming and sheet_name not in self._grids:
+                labels = scan_labels_rows(self.iter_rows(sheet_name), find_device=find_device)
+            else:
+                labels = scan_labels(self.grid(sheet_name), find_device=find_device)
+            cached = (labels, find_device)
+            self._labels[sheet_name] = cached
+        return cached[0]
+
+    def close(self):
+        self.reader.close()
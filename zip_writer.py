@@ -0,0 +1,111 @@
+import os
+import struct
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# deflate压缩级别：0为只存储不压缩，1最快，9最小
+DEFAULT_ZIP_LEVEL = 6
+DEFAULT_ZIP_THREADS = min(8, os.cpu_count() or 1)
+_MAX16 = 0xFFFF
+_MAX32 = 0xFFFFFFFF
+# 超过时改用zip64记录（与 zipfile.ZIP64_LIMIT 相同）
+_ZIP64_LIMIT = (1 << 31) - 1
+
+
+def zip_level():
+    # JSON_EXPORTER_ZIP_LEVEL
+    return min(9, max(0, int(os.environ.get("JSON_EXPORTER_ZIP_LEVEL", DEFAULT_ZIP_LEVEL))))
+
+def zip_threads():
+    # JSON_EXPORTER_ZIP_THREADS
+    return max(1, int(os.environ.get("JSON_EXPORTER_ZIP_THREADS", DEFAULT_ZIP_THREADS)))
+
+def zip_method(level):
+    return zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+
+def _compress(payload, level):
+    # zlib压缩和crc32都会释放GIL，多个成员可以在线程中同时压缩
+    crc = zlib.crc32(payload)
+    if level == 0:
+        return payload, crc
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(payload) + compressor.flush(), crc
+
+def _field(value):
+    # 超出32位的值在头中写 0xFFFFFFFF，实际值放在zip64扩展字段
+    return _MAX32 if value > _ZIP64_LIMIT else value
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+class _ZipOut:
+    # 按ZIP格式（APPNOTE）直接写出已压缩的成员：本地文件头 + 数据，最后写中央目录，
+    # 大小、偏移或成员数超出32位/16位时用zip64记录（与 zipfile 写出的格式相同，只用公开的 struct/zlib）
+    def __init__(self, fileobj, method, date_time):
+        self.fp = fileobj
+        self.method = method
+        self.time, self.date = _dos_time(date_time)
+        self.offset = 0
+        self.entries = []
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def append(self, name, size, data, crc):
+        encoded = name.encode("utf-8")
+        # 非ASCII文件名设置UTF-8标志位
+        flags = 0x800 if not name.isascii() else 0
+        zip64 = size > _ZIP64_LIMIT or len(data) > _ZIP64_LIMIT
+        extra = struct.pack("<HHQQ", 1, 16, size, len(data)) if zip64 else b""
+        header = struct.pack(
+            "<4sHHHHHLLLHH", b"PK\x03\x04", 45 if zip64 else 20, flags, self.method, self.time, self.date, crc,
+            _MAX32 if zip64 else len(data), _MAX32 if zip64 else size, len(encoded), len(extra)
+        )
+        self.entries.append((encoded, flags, crc, size, len(data), self.offset))
+        self._write(header + encoded + extra)
+        self._write(data)
+
+    def close(self):
+        start = self.offset
+        for encoded, flags, crc, size, compressed, offset in self.entries:
+            big = [v for v in (size, compressed, offset) if v > _ZIP64_LIMIT]
+            extra = struct.pack(f"<HH{len(big)}Q", 1, 8 * len(big), *big) if big else b""
+            version = 45 if big else 20
+            self._write(struct.pack(
+                "<4sHHHHHHLLLHHHHHLL", b"PK\x01\x02", (3 << 8) | version, version, flags, self.method,
+                self.time, self.date, crc, _field(compressed), _field(size),
+                len(encoded), len(extra), 0, 0, 0, 0o600 << 16, _field(offset)
+            ) + encoded + extra)
+        count, size = len(self.entries), self.offset - start
+        if count > _MAX16 or size > _ZIP64_LIMIT or start > _ZIP64_LIMIT:
+            end64 = self.offset
+            self._write(struct.pack("<4sQHHLLQQQQ", b"PK\x06\x06", 44, 45, 45, 0, 0, count, count, size, start))
+            self._write(struct.pack("<4sLQL", b"PK\x06\x07", 0, end64, 1))
+        self._write(struct.pack(
+            "<4sHHHHLLH", b"PK\x05\x06", 0, 0, min(count, _MAX16), min(count, _MAX16),
+            _field(size), _field(start), 0
+        ))
+
+def write_zip(members, fileobj, level=None, workers=None):
+    # members 为 (文件名, bytes) 序列。各成员在线程池中并行压缩，按原顺序写入 fileobj；
+    # 同时在压缩的成员不超过 2*workers 个，写出后即释放压缩结果
+    level = zip_level() if level is None else level
+    workers = zip_threads() if workers is None else workers
+    out = _ZipOut(fileobj, zip_method(level), time.localtime(time.time())[:6])
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zip") as pool:
+        window = deque()
+        for name, payload in members:
+            window.append((name, len(payload), pool.submit(_compress, payload, level)))
+            if len(window) > 2 * workers:
+                name, size, future = window.popleft()
+                out.append(name, size, *future.result())
+        while window:
+            name, size, future = window.popleft()
+            out.append(name, size, *future.result())
+    out.close()